@@ -7,11 +7,17 @@ from avilla.core.context import Context
 from avilla.core.selector import Selector
 
 if TYPE_CHECKING:
+    from .client import CAIClient
     from .protocol import CAIProtocol
 
 
 class CAIAccount(AbstractAccount):
     protocol: CAIProtocol
+    connection: CAIClient
+
+    def __init__(self, id: str, protocol: CAIProtocol, connection: CAIClient):
+        super().__init__(id, protocol)
+        self.connection = connection
 
     async def get_context(self, target: Selector, *, via: Selector | None = None) -> Context:
         # TODO: 对象存在性检查
@@ -34,7 +40,7 @@ class CAIAccount(AbstractAccount):
 
     @property
     def client(self) -> Client:
-        return self.protocol.service.get_client(self.id).client
+        return self.connection.client
 
     @property
     def available(self) -> bool:
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from functools import partial
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from .utils import atomic_write
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    maxsize: int
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key: K, value: V):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self) -> List[Tuple[K, V]]:
+        return list(self._data.items())
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight(Generic[K, V]):
+    """Results of keyed loads, kept for ``ttl`` seconds.
+
+    Callers asking for a key while it is being loaded share that load. A key
+    invalidated during its load does not keep the result, it may be stale.
+    """
+
+    ttl: float
+    loads: int
+    shared: int
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.loads = 0
+        self.shared = 0
+        self._results: LRUCache[K, Tuple[float, V]] = LRUCache(maxsize)
+        self._pending: Dict[K, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def peek(self, key: K) -> Optional[V]:
+        """The result of ``key`` if it is cached and not expired, without loading."""
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+    async def get(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.shared += 1
+            return cached[1]
+        task = self._pending.get(key)
+        if task is None:
+            self.loads += 1
+            task = asyncio.ensure_future(load())
+            self._pending[key] = task
+            task.add_done_callback(partial(self._settle, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: K):
+        self._results.pop(key)
+        self._pending.pop(key, None)
+
+    def clear(self):
+        self._results.clear()
+        self._pending.clear()
+
+    def _settle(self, key: K, task: asyncio.Task):
+        if self._pending.get(key) is not task:
+            # invalidated while in flight
+            return
+        del self._pending[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._results.set(key, (time.monotonic() + self.ttl, task.result()))
+
+
+class ResourceCache:
+    """Bytes of fetched resources, in a memory LRU backed by a directory.
+
+    Both tiers are bounded by a byte budget, entries larger than
+    ``item_size`` are not cached at all.
+    """
+
+    root: Optional[Path]
+    memory_bytes: int
+    disk_bytes: int
+    item_size: int
+
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        memory_bytes: int = 32 * 1024 * 1024,
+        disk_bytes: int = 256 * 1024 * 1024,
+        item_size: int = 8 * 1024 * 1024,
+    ):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes if root else 0
+        self.item_size = item_size
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_used = 0
+        self._disk: Optional[OrderedDict[str, int]] = None
+        self._disk_used = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_bytes": self._memory_used,
+            "disk_bytes": self._disk_used,
+        }
+
+    async def get(self, key: str) -> Optional[bytes]:
+        name = self._name(key)
+        data = self._memory.get(name)
+        if data is not None:
+            self._memory.move_to_end(name)
+            self.memory_hits += 1
+            return data
+        if self.disk_bytes and name in await self._disk_index():
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(None, self._path(name).read_bytes)
+            except OSError:
+                self._forget(name)
+            else:
+                assert self._disk is not None
+                self._disk.move_to_end(name)
+                self.disk_hits += 1
+                self._remember(name, data)
+                return data
+        self.misses += 1
+
+    async def put(self, key: str, data: bytes):
+        if len(data) > self.item_size:
+            return
+        name = self._name(key)
+        self._remember(name, data)
+        if not self.disk_bytes:
+            return
+        index = await self._disk_index()
+        if name in index:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, atomic_write, self._path(name), data)
+        except OSError as e:
+            logger.debug(f"failed to cache resource {key} on disk: {e!r}")
+            return
+        index[name] = len(data)
+        self._disk_used += len(data)
+        stale = []
+        while self._disk_used > self.disk_bytes and len(index) > 1:
+            evicted, size = index.popitem(last=False)
+            self._disk_used -= size
+            stale.append(self._path(evicted))
+        if stale:
+            await asyncio.get_running_loop().run_in_executor(None, _unlink_all, stale)
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _path(self, name: str) -> Path:
+        assert self.root is not None
+        return self.root / name[:2] / name
+
+    def _remember(self, name: str, data: bytes):
+        if name in self._memory:
+            self._memory.move_to_end(name)
+            return
+        self._memory[name] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes and self._memory:
+            self._memory_used -= len(self._memory.popitem(last=False)[1])
+
+    def _forget(self, name: str):
+        if self._disk is not None and name in self._disk:
+            self._disk_used -= self._disk.pop(name)
+
+    async def _disk_index(self) -> OrderedDict[str, int]:
+        if self._disk is None:
+            entries = await asyncio.get_running_loop().run_in_executor(None, self._scan)
+            self._disk = OrderedDict(entries)
+            self._disk_used = sum(self._disk.values())
+        return self._disk
+
+    def _scan(self) -> List[Tuple[str, int]]:
+        # oldest first, so eviction after a restart still follows usage roughly
+        assert self.root is not None
+        if not self.root.exists():
+            return []
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            with suppress(OSError):
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.name, stat.st_size))
+        return [(name, size) for _, name, size in sorted(entries)]
+
+
+def _unlink_all(paths: List[Path]):
+    for path in paths:
+        with suppress(OSError):
+            path.unlink()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any, Coroutine, List, Optional
+
+from cai.client.message_service.models import Element as CAIElement
+from cai.client.message_service.models import TextElement
+from graia.amnesia.message import __message_chain_class__
+from graia.amnesia.message.element import Element
+
+if TYPE_CHECKING:
+    from avilla.core.context import Context
+
+    from .protocol import CAIProtocol
+
+
+def _resolve(coro: Coroutine[Any, Any, Any]) -> Any:
+    # element parsers only build objects, they complete without suspending
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("element parser suspended, it cannot be used by a lazy message chain")
+
+
+class LazyMessageChain(__message_chain_class__):
+    """Message chain that keeps the raw CAI elements until ``content`` is read.
+
+    ``str()``, ``startswith`` and ``endswith`` are answered from the raw
+    elements when they are text, so messages nobody reads are never converted.
+    Pickling keeps the raw elements too, a chain loaded from a pickle has to be
+    ``bind``-ed again before it can be converted.
+    """
+
+    _content: Optional[List[Element]] = None
+    _raw: Optional[List[CAIElement]] = None
+    _protocol: Optional[CAIProtocol] = None
+    _context: Optional[Context] = None
+
+    @classmethod
+    def from_raw(cls, protocol: CAIProtocol, context: Context, raw: List[CAIElement]) -> LazyMessageChain:
+        chain = cls.__new__(cls)
+        chain._raw = raw
+        chain._protocol = protocol
+        chain._context = context
+        return chain
+
+    def bind(self, protocol: CAIProtocol, context: Context):
+        if self._raw is not None:
+            self._protocol = protocol
+            self._context = context
+
+    @property
+    def content(self) -> List[Element]:
+        if self._content is None:
+            self._content = self._materialize()
+        return self._content
+
+    @content.setter
+    def content(self, value: List[Element]):
+        self._content = value
+        self._raw = self._protocol = self._context = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._content is not None
+
+    def preview(self) -> str:
+        """Text of the message with ``[type]`` for other elements, without converting it."""
+        if self._raw is None:
+            return str(self)
+        return "".join(
+            element.content if isinstance(element, TextElement) else f"[{getattr(element, 'type', '?')}]"
+            for element in self._raw
+        )
+
+    def size_hint(self) -> int:
+        if self._raw is None:
+            return len(str(self))
+        return sum(len(element.content) if isinstance(element, TextElement) else 64 for element in self._raw)
+
+    def __str__(self) -> str:
+        if self._raw is not None and all(isinstance(element, TextElement) for element in self._raw):
+            return "".join(element.content for element in self._raw)
+        return super().__str__()
+
+    def startswith(self, string: str) -> bool:
+        if self._raw is not None and self._raw and isinstance(self._raw[0], TextElement):
+            return self._raw[0].content.startswith(string)
+        return super().startswith(string)
+
+    def endswith(self, string: str) -> bool:
+        if self._raw is not None and self._raw and isinstance(self._raw[-1], TextElement):
+            return self._raw[-1].content.endswith(string)
+        return super().endswith(string)
+
+    def __reduce__(self):
+        if self._raw is not None:
+            return _unbound, (self._raw,)
+        return __message_chain_class__, (list(self.content),)
+
+    def _materialize(self) -> List[Element]:
+        protocol, context, raw = self._protocol, self._context, self._raw
+        if raw is None:
+            return []
+        if protocol is None or context is None:
+            raise RuntimeError("lazy message chain is not bound, it cannot be converted")
+        started = time.perf_counter()
+        content: List[Element] = []
+        for raw_element in raw:
+            try:
+                element_type = raw_element.type
+            except AttributeError:
+                raise KeyError(f'expected "type" exists for {raw_element}') from None
+            parser = protocol.get_element_parser(element_type)
+            if parser is None:
+                raise NotImplementedError(f'expected element "{element_type}" implemented for {raw_element}')
+            content.append(_resolve(parser(context, raw_element)))
+        protocol.metrics.observe("deserialize_message", context.account.id, "lazy", time.perf_counter() - started)
+        self._raw = self._protocol = self._context = None
+        return content
+
+
+def _unbound(raw: List[CAIElement]) -> LazyMessageChain:
+    chain = LazyMessageChain.__new__(LazyMessageChain)
+    chain._raw = raw
+    return chain
@@ -1,19 +1,38 @@
 from __future__ import annotations
 
+import asyncio
+import random
+import time
 import traceback
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Set, Tuple
 from cai import Client
 from cai.client.events import Event
+from cai.client.events.common import BotOfflineEvent, BotOnlineEvent
+from cai.client.events.group import GroupNameChangedEvent
 from launart import Launchable, Launart
-from contextlib import suppress
 from loguru import logger
+from avilla.core.context import Context
 from avilla.core.event import AvillaEvent
+from avilla.core.message import Message
+from avilla.core.selector import Selector
 from avilla.spec.core.message import MessageReceived
 from avilla.spec.core.application import AccountStatusChanged
 from avilla.spec.core.profile import Summary
 
+from .cache import LRUCache, ResourceCache
+from .chain import LazyMessageChain
+from .coalesce import CoalescedAPI
 from .config import CAIConfig
-from .utils import login_resolver
+from .contacts import ContactCache
+from .dispatch import EventDispatcher
+from .exceptions import AccountOffline
+from .outbound import OutboundScheduler
+from .roster import MemberRoster
+from .selector import SelectorPool, scene_context
+from .store import MessageStore
+from .upload import UploadCache
+from .utils import atomic_write, login_resolver, pack_siginfo, unpack_siginfo
 
 if TYPE_CHECKING:
     from .account import CAIAccount
@@ -25,6 +44,16 @@ class CAIClient(Launchable):
     config: CAIConfig
     client: Client
     account: CAIAccount
+    selectors: SelectorPool
+    api: CoalescedAPI
+    roster: MemberRoster
+    contacts: ContactCache
+    names: LRUCache[tuple, Tuple[str, float]]
+    dispatcher: EventDispatcher
+    messages: MessageStore
+    uploads: UploadCache
+    resources: ResourceCache
+    outbound: OutboundScheduler
 
     @property
     def required(self):
@@ -35,61 +64,156 @@ class CAIClient(Launchable):
         return {"preparing", "cleanup"}
 
     def register(self):
-        # NOTE: for hot registration
-        # FIXME: require testing
-
         if self.account not in self.protocol.avilla.accounts:
             self.protocol.avilla.add_account(self.account)
             logger.opt(colors=True).success(
                 f"<green>Registered account: </><magenta>{self.config.account}</>",
                 alt=f"[green]Registered account: [magenta]{self.config.account}[/]",
             )
+            self.dispatcher.start()
             self.client.add_event_listener(self._cai_event_hook)
+            self.protocol.metrics.add_gauges(self.account.id, self.gauges)
+
+    def unregister(self):
+        self.protocol.metrics.remove_gauges(self.account.id)
+        if self.account in self.protocol.avilla.accounts:
+            self.protocol.avilla.accounts.remove(self.account)
+            logger.opt(colors=True).success(
+                f"<green>Unregistered account: </><magenta>{self.config.account}</>",
+                alt=f"[green]Unregistered account: [magenta]{self.config.account}[/]",
+            )
 
-    def __init__(self, protocol: CAIProtocol, config: CAIConfig) -> None:
+    def __init__(self, protocol: CAIProtocol, config: CAIConfig, client: Client | None = None) -> None:
         super().__init__()
         from avilla.cai.account import CAIAccount
 
         self.id = f"cai.client.{config.account}"
         self.protocol = protocol
         self.config = config
-        self.client = Client(int(self.config.account), self.config.password, self.config.protocol)
-        self.account = CAIAccount(str(self.config.account), self.protocol)
+        if client is not None:
+            # a prepared client, such as a fake one for benchmarks
+            self.client = client
+        elif protocol.service.shards:
+            self.client = protocol.service.shards.client_for(config)  # type: ignore
+        else:
+            self.client = Client(int(self.config.account), self.config.password, self.config.protocol)
+        self.account = CAIAccount(str(self.config.account), self.protocol, self)
+        self.selectors = SelectorPool(
+            self.protocol.land.name, self.account.id, self.account.to_selector(), self.config.selector_pool_size
+        )
+        self.api = CoalescedAPI(self.client, self.config.api_cache_ttl)
+        self.roster = MemberRoster(self.api, self.config.roster_ttl)
+        self.contacts = ContactCache(self.api, self.config.contact_ttl)
+        self.names = LRUCache(self.config.name_cache_size)
+        self._resolving: Set[tuple] = set()
+        self._background: Set[asyncio.Task] = set()
+        self._upload_limit: asyncio.Semaphore | None = None
+        self._stopped = False
+        self._online: asyncio.Event | None = None
+        self._reconnecting: asyncio.Task | None = None
+        self._checkpoint: asyncio.Task | None = None
+        self.reconnects = 0
+        self.reconnect_failures = 0
+        self.last_reconnect_latency = 0.0
+        self.dispatcher = EventDispatcher(
+            self.handle_event,
+            self.config.dispatch_workers,
+            self.config.dispatch_queue_size,
+            self.config.dispatch_overflow,
+        )
+        self.messages = MessageStore(
+            self.config.message_cache_size,
+            self.config.message_cache_bytes,
+            self.config.message_store_path if self.config.message_spill else None,
+            self.config.message_spill_ttl,
+            self._bind_message,
+        )
+        self.uploads = UploadCache(
+            self.config.upload_cache_size,
+            self.config.upload_cache_path if self.config.upload_cache_persist else None,
+        )
+        self.resources = ResourceCache(
+            self.config.resource_cache_dir,
+            self.config.resource_cache_memory,
+            self.config.resource_cache_disk,
+            self.config.resource_cache_item_size,
+        )
+        self.outbound = OutboundScheduler(
+            self.config.send_rate,
+            self.config.send_burst,
+            self.config.account_send_rate,
+            self.config.account_send_burst,
+            self.config.send_coalesce,
+        )
+
+    @property
+    def upload_limit(self) -> asyncio.Semaphore:
+        # created lazily, so it binds to the running loop
+        if self._upload_limit is None:
+            self._upload_limit = asyncio.Semaphore(self.config.upload_concurrency)
+        return self._upload_limit
+
+    def resolve_name(self, ctx: Context, target: Selector) -> str:
+        """Name of target from the local cache; misses and expired names are filled in the background."""
+        key = tuple((k, v) for k, v in target.pattern.items() if k != "land")
+        entry = self.names.get(key)
+        if (entry is None or entry[1] <= time.monotonic()) and key not in self._resolving:
+            self._resolving.add(key)
+            task = asyncio.create_task(self._fill_name(ctx, target, key))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        # an expired name is still shown until the new one arrives
+        return "" if entry is None else entry[0]
+
+    async def _fill_name(self, ctx: Context, target: Selector, key: tuple):
+        try:
+            name = (await ctx.pull(Summary, target)).name or ""
+        except Exception as e:
+            # cached briefly, so a target that always fails is not pulled on every message
+            logger.debug(f"failed to resolve name of {target}: {e!r}")
+            previous = self.names.get(key)
+            self.names.set(key, (previous[0] if previous else "", time.monotonic() + self.config.name_failure_ttl))
+        else:
+            self.names.set(key, (name, time.monotonic() + self.config.name_cache_ttl))
+        finally:
+            self._resolving.discard(key)
 
-    async def record_event(self, event: AvillaEvent):
+    def _bind_message(self, message: Message):
+        # 从磁盘读回的惰性消息链需要重新绑定才能转换
+        if isinstance(message.content, LazyMessageChain):
+            message.content.bind(self.protocol, scene_context(self.account, message.scene, message.sender))
+
+    def record_event(self, event: AvillaEvent):
         if isinstance(event, MessageReceived):
             _mr: MessageReceived = event
             ctx = _mr.context
+            content = _mr.message.content
+            # 不为日志转换惰性消息链
+            text = content.preview() if isinstance(content, LazyMessageChain) else str(content)
             sender = _mr.message.sender
             if (
                 sender.last_value == self.account.id
                 and sender['land'] == self.account.land.name
             ):
-                name: str = ""
-                with suppress(NotImplementedError):
-                    name = (await ctx.pull(Summary, _mr.message.scene)).name
+                name = self.resolve_name(ctx, _mr.message.scene)
                 scene_id = _mr.message.scene.last_value
                 logger.info(
                     f"{self.account.land.name}: [send]"
                     f"[{_mr.message.scene.last_key.title()}({f'{name}, ' if name else ''}{scene_id})]"
-                    f" <- {str(_mr.message.content)!r}"
+                    f" <- {text!r}"
                 )
             else:
-                main_name: str = ""
-                with suppress(NotImplementedError):
-                    main_name = (await ctx.pull(Summary, _mr.message.scene)).name
+                main_name = self.resolve_name(ctx, _mr.message.scene)
                 scene_id = _mr.message.scene.last_value
-                sender_name: str = ""
-                with suppress(NotImplementedError):
-                    sender_name = (await ctx.pull(Summary, sender)).name
                 sender_id = sender.last_value
                 out = f"[{_mr.message.scene.last_key.title()}({f'{main_name}, ' if main_name else ''}{scene_id})]"
                 if sender_id != scene_id:
+                    sender_name = self.resolve_name(ctx, sender)
                     out += f" {sender_name or sender.last_key.title()}({sender_id})"
 
                 logger.info(
                     f"{self.account.land.name}: [recv]{out}"
-                    f" -> {str(_mr.message.content)!r}"
+                    f" -> {text!r}"
                 )
         elif not isinstance(event, AccountStatusChanged):
             logger.info(
@@ -98,39 +222,205 @@ class CAIClient(Launchable):
             )
 
     async def _cai_event_hook(self, _: Client, event: Event):
-        parsed_event, _ctx = await self.protocol.parse_event(
-            self.account, event
+        # cai has no way to remove a listener, events after stop() are ignored,
+        # including those arriving while the queued ones are drained
+        if self.dispatcher.running and not self._stopped:
+            await self.dispatcher.put(event)
+
+    @property
+    def online(self) -> bool:
+        return self._online is not None and self._online.is_set()
+
+    def reconnect_stats(self) -> Dict[str, float]:
+        return {
+            "online": float(self.online),
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnect_failures,
+            "last_reconnect_latency": self.last_reconnect_latency,
+        }
+
+    def gauges(self) -> Dict[str, float]:
+        """Queue, cache and connection state of this account, for metrics."""
+        values: Dict[str, float] = {}
+        for prefix, stats in (
+            ("dispatch", self.dispatcher.stats()),
+            ("outbound", self.outbound.stats()),
+            ("api", self.api.stats()),
+            ("resource_cache", self.resources.stats()),
+        ):
+            for name, value in stats.items():
+                values[f"{prefix}_{name}"] = value
+        values.update(self.reconnect_stats())
+        values["message_store_bytes"] = self.messages.bytes
+        return values
+
+    async def ensure_online(self):
+        """Wait for the account to be online before sending, or raise AccountOffline."""
+        if self.online:
+            return
+        if self._online is None or self.config.offline_send_timeout <= 0:
+            raise AccountOffline(f"account {self.config.account} is offline")
+        try:
+            await asyncio.wait_for(self._online.wait(), self.config.offline_send_timeout)
+        except asyncio.TimeoutError:
+            raise AccountOffline(f"account {self.config.account} is still offline") from None
+
+    def _on_offline(self):
+        if self._online is not None:
+            self._online.clear()
+        if self._stopped or not self.config.reconnect_retries:
+            return
+        if self._reconnecting is None or self._reconnecting.done():
+            self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        started = time.monotonic()
+        for attempt in range(self.config.reconnect_retries):
+            delay = min(self.config.reconnect_max_delay, self.config.reconnect_base_delay * 2**attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            if self.client.connected:
+                # cai brought the connection back by itself
+                break
+            try:
+                try:
+                    sig = self.client.dump_sig()
+                except Exception:
+                    sig = await self.read_siginfo()
+                if sig is None:
+                    await self.client.login()
+                else:
+                    await self.client.token_login(sig)
+                break
+            except Exception as e:
+                self.reconnect_failures += 1
+                logger.warning(f"account {self.config.account} failed to reconnect (#{attempt + 1}): {e!r}")
+        else:
+            logger.error(
+                f"account {self.config.account} is still offline after {self.config.reconnect_retries} retries"
+            )
+            return
+        self.reconnects += 1
+        self.last_reconnect_latency = time.monotonic() - started
+        assert self._online is not None
+        self._online.set()
+        logger.success(
+            f"account {self.config.account} reconnected in {self.last_reconnect_latency:.2f}s"
         )
+        await self.save_siginfo()
+
+    async def handle_event(self, event: Event):
+        if isinstance(event, BotOfflineEvent):
+            self._on_offline()
+        elif isinstance(event, BotOnlineEvent) and self._online is not None:
+            self._online.set()
+        self.api.feed(event)
+        self.roster.feed(event)
+        self.contacts.feed(event)
+        if isinstance(event, GroupNameChangedEvent):
+            self.names.pop((("group", str(event.group_id)),))
+        metrics = self.protocol.metrics
+        started = time.perf_counter()
+        result = await self.protocol.parse_event(self.account, event)
+        parsed = time.perf_counter()
+        metrics.observe("parse_event", self.account.id, getattr(event, "type", ""), parsed - started)
+        if result is None:
+            return
+        parsed_event, _ctx = result
         if parsed_event:
-            await self.record_event(parsed_event)
+            label = parsed_event.__class__.__name__
             self.protocol.post_event(parsed_event)
+            posted = time.perf_counter()
+            metrics.observe("post", self.account.id, label, posted - parsed)
+            self.record_event(parsed_event)
+            metrics.observe("record_event", self.account.id, label, time.perf_counter() - posted)
 
-    async def launch(self, manager: Launart):
-        async with self.stage("preparing"):
-            logger.opt(colors=True).info(
-                f"waiting for <magenta>{self.config.account}</> login...",
-                alt=f"waiting for [magenta]{self.config.account}[/] login...",
+    async def read_siginfo(self) -> bytes | None:
+        if not self.config.cache_siginfo:
+            return
+        path = self.config.cache_path
+        try:
+            blob = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"failed to read account {self.config.account}'s siginfo: {e!r}")
+            return
+        data = unpack_siginfo(blob)
+        if data is None:
+            logger.warning(f"account {self.config.account}'s siginfo is corrupt, ignored")
+        return data
+
+    async def save_siginfo(self):
+        if not self.config.cache_siginfo:
+            return
+        try:
+            data = pack_siginfo(self.client.dump_sig())
+            await asyncio.get_running_loop().run_in_executor(
+                None, atomic_write, self.config.cache_path, data
             )
-            try:
+        except Exception as e:
+            logger.warning(f"failed to save account {self.config.account}'s siginfo: {e!r}")
+            return
+        logger.debug(f"account {self.config.account}'s siginfo saved.")
+
+    async def _checkpoint_siginfo(self):
+        while True:
+            await asyncio.sleep(self.config.siginfo_interval)
+            if self.online:
+                await self.save_siginfo()
+
+    async def login(self):
+        async def attempt():
+            sig = await self.read_siginfo()
+            if sig is not None:
+                logger.debug(f"using account {self.config.account}'s siginfo")
                 try:
-                    if self.config.cache_siginfo and self.config.cache_path.exists():
-                        logger.debug(f"using account {self.config.account}'s siginfo")
-                        await self.client.token_login(self.config.cache_path.open("rb").read())
-                    else:
-                        await self.client.login()
+                    return await self.client.token_login(sig)
                 except Exception as e:
-                    await login_resolver(self.client, e)
-                self.register()
+                    logger.warning(f"account {self.config.account} failed to login by siginfo: {e!r}")
+            await self.client.login()
+
+        await self.protocol.service.logins.run(attempt, partial(login_resolver, self.client))
+
+    async def start(self):
+        """Log in and start receiving events, also used for accounts added at runtime."""
+        logger.opt(colors=True).info(
+            f"waiting for <magenta>{self.config.account}</> login...",
+            alt=f"waiting for [magenta]{self.config.account}[/] login...",
+        )
+        self._online = asyncio.Event()
+        await self.uploads.load()
+        await self.login()
+        self._online.set()
+        await self.save_siginfo()
+        if self.config.cache_siginfo and self.config.siginfo_interval > 0:
+            self._checkpoint = asyncio.create_task(self._checkpoint_siginfo())
+        self.register()
+
+    async def stop(self):
+        """Stop taking events, drain the queued ones, then log out and persist state."""
+        if self._stopped:
+            return
+        self._stopped = True
+        for task in (self._reconnecting, self._checkpoint):
+            if task is not None:
+                task.cancel()
+        self.unregister()
+        await self.dispatcher.close(self.config.dispatch_drain_timeout)
+        await self.outbound.close(self.config.dispatch_drain_timeout)
+        await self.messages.close()
+        await self.uploads.save()
+        if self.client.connected:
+            await self.client.session.close()
+            await self.save_siginfo()
+
+    async def launch(self, manager: Launart):
+        async with self.stage("preparing"):
+            try:
+                await self.start()
             except Exception as e:
                 logger.warning(e)
                 manager.status.exiting = True
                 traceback.print_exc()
         async with self.stage("cleanup"):
-            if self.client.connected:
-                await self.client.session.close()
-                if self.config.cache_siginfo:
-                    data = self.client.dump_sig()
-                    self.config.cache_path.parent.mkdir(parents=True, exist_ok=True)
-                    with self.config.cache_path.open("wb+") as f:
-                        f.write(data)
-                    logger.success(f"account {self.config.account}'s siginfo saved.")
+            await self.stop()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from cai import Client
+from cai.client.events import Event as CAIEvent
+from cai.client.events.group import GroupNameChangedEvent
+from cai.client.models import Friend, Group, GroupMember
+
+from .cache import SingleFlight
+from .roster import INVALIDATING_EVENTS
+
+Key = Tuple[Any, ...]
+
+
+class CoalescedAPI:
+    """Read-only CAI client calls, coalesced.
+
+    Identical calls made while one is in flight share its result, which is then
+    kept for ``ttl`` seconds. Events changing a group drop what is cached for it.
+    """
+
+    client: Client
+    ttl: float
+
+    def __init__(self, client: Client, ttl: float = 5.0, maxsize: int = 1024):
+        self.client = client
+        self.ttl = ttl
+        self._flights: SingleFlight[Key, Any] = SingleFlight(ttl, maxsize)
+
+    async def get_group(self, group_id: int) -> Optional[Group]:
+        return await self.call("get_group", group_id)
+
+    async def get_group_list(self) -> List[Group]:
+        return await self.call("get_group_list")
+
+    async def get_group_member_list(self, group_id: int) -> Optional[List[GroupMember]]:
+        return await self.call("get_group_member_list", group_id)
+
+    async def get_friend(self, uin: int) -> Optional[Friend]:
+        return await self.call("get_friend", uin)
+
+    async def get_friend_list(self) -> List[Friend]:
+        return await self.call("get_friend_list")
+
+    async def call(self, method: str, *args) -> Any:
+        return await self._flights.get((method, *args), lambda: getattr(self.client, method)(*args))
+
+    def invalidate(self, method: str | None = None, *args):
+        """Drop cached results, of one call if ``method`` is given."""
+        if method is None:
+            self._flights.clear()
+        else:
+            self._flights.invalidate((method, *args))
+
+    def feed(self, event: CAIEvent):
+        if isinstance(event, (*INVALIDATING_EVENTS, GroupNameChangedEvent)):
+            self.invalidate("get_group", event.group_id)
+            self.invalidate("get_group_member_list", event.group_id)
+
+    def stats(self) -> Dict[str, int]:
+        flights = self._flights
+        return {"calls": flights.loads, "shared": flights.shared, "pending": flights.pending}
@@ -12,6 +12,43 @@ class CAIConfig:
     cache_siginfo: bool = field(default=True, repr=False)
     cache_root: Optional[str] = field(default=".cache", repr=False)
     config_root: Optional[str] = field(default=None, repr=False)
+    roster_ttl: float = field(default=60.0, repr=False)
+    name_cache_size: int = field(default=4096, repr=False)
+    dispatch_workers: int = field(default=4, repr=False)
+    dispatch_queue_size: int = field(default=512, repr=False)
+    dispatch_overflow: Literal["block", "drop"] = field(default="block", repr=False)
+    dispatch_drain_timeout: Optional[float] = field(default=10.0, repr=False)
+    message_cache_size: int = field(default=4096, repr=False)
+    message_cache_bytes: int = field(default=16 * 1024 * 1024, repr=False)
+    message_spill: bool = field(default=False, repr=False)
+    message_spill_ttl: float = field(default=6 * 3600, repr=False)
+    upload_cache_size: int = field(default=512, repr=False)
+    upload_cache_persist: bool = field(default=False, repr=False)
+    upload_concurrency: int = field(default=4, repr=False)
+    fetch_max_size: int = field(default=64 * 1024 * 1024, repr=False)
+    fetch_spool_threshold: int = field(default=1024 * 1024, repr=False)
+    fetch_timeout: float = field(default=60.0, repr=False)
+    fetch_retries: int = field(default=3, repr=False)
+    fetch_backoff: float = field(default=0.5, repr=False)
+    resource_cache_memory: int = field(default=32 * 1024 * 1024, repr=False)
+    resource_cache_disk: int = field(default=256 * 1024 * 1024, repr=False)
+    resource_cache_item_size: int = field(default=8 * 1024 * 1024, repr=False)
+    reconnect_retries: int = field(default=10, repr=False)
+    reconnect_base_delay: float = field(default=1.0, repr=False)
+    reconnect_max_delay: float = field(default=300.0, repr=False)
+    offline_send_timeout: float = field(default=30.0, repr=False)
+    siginfo_interval: float = field(default=600.0, repr=False)
+    send_rate: float = field(default=1.0, repr=False)
+    send_burst: int = field(default=5, repr=False)
+    account_send_rate: float = field(default=5.0, repr=False)
+    account_send_burst: int = field(default=10, repr=False)
+    send_coalesce: bool = field(default=False, repr=False)
+    api_cache_ttl: float = field(default=5.0, repr=False)
+    contact_ttl: float = field(default=300.0, repr=False)
+    selector_pool_size: int = field(default=8192, repr=False)
+    lazy_message: bool = field(default=False, repr=False)
+    name_cache_ttl: float = field(default=600.0, repr=False)
+    name_failure_ttl: float = field(default=60.0, repr=False)
 
     def init_dir(self):
         if self.cache_root:
@@ -22,3 +59,15 @@ class CAIConfig:
     @property
     def cache_path(self) -> Path:
         return Path(self.cache_root or Storage.cache_dir) / f"{self.account}" / "siginfo.sig"
+
+    @property
+    def message_store_path(self) -> Path:
+        return Path(self.cache_root or Storage.cache_dir) / f"{self.account}" / "messages.db"
+
+    @property
+    def upload_cache_path(self) -> Path:
+        return Path(self.cache_root or Storage.cache_dir) / f"{self.account}" / "uploads.pickle"
+
+    @property
+    def resource_cache_dir(self) -> Path:
+        return Path(self.cache_root or Storage.cache_dir) / f"{self.account}" / "resources"
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Set, Tuple
+
+from cai.client.events import Event as CAIEvent
+from cai.client.events.group import GroupMemberJoinedEvent, GroupNameChangedEvent, TransferGroupEvent
+from cai.client.models import Friend, Group
+
+from .cache import SingleFlight
+
+if TYPE_CHECKING:
+    from .coalesce import CoalescedAPI
+
+
+class ContactCache:
+    """Friend and group lists of one account, indexed by id.
+
+    Single lookups also serve profile pulls. Events that change a group only
+    mark its entry stale, the next lookup then refreshes that entry alone.
+    """
+
+    api: CoalescedAPI
+    ttl: float
+
+    def __init__(self, api: CoalescedAPI, ttl: float = 300.0):
+        self.api = api
+        self.ttl = ttl
+        self._indexes: SingleFlight[str, Dict[int, Any]] = SingleFlight(ttl)
+        self._stale: Set[Tuple[str, int]] = set()
+
+    async def friends(self) -> Dict[int, Friend]:
+        return await self._indexes.get("friends", self._load_friends)
+
+    async def groups(self) -> Dict[int, Group]:
+        return await self._indexes.get("groups", self._load_groups)
+
+    async def friend(self, uin: int) -> Friend | None:
+        friends = await self.friends()
+        if uin in friends and ("friends", uin) not in self._stale:
+            return friends[uin]
+        return self._refresh("friends", uin, await self.api.get_friend(uin))
+
+    async def group(self, group_id: int) -> Group | None:
+        groups = await self.groups()
+        if group_id in groups and ("groups", group_id) not in self._stale:
+            return groups[group_id]
+        return self._refresh("groups", group_id, await self.api.get_group(group_id))
+
+    def invalidate(self, kind: str | None = None):
+        for name in (kind,) if kind else ("friends", "groups"):
+            self._indexes.invalidate(name)
+            self._stale = {key for key in self._stale if key[0] != name}
+
+    def feed(self, event: CAIEvent):
+        if isinstance(event, (GroupNameChangedEvent, GroupMemberJoinedEvent, TransferGroupEvent)):
+            groups = self._indexes.peek("groups")
+            if groups is not None and event.group_id not in groups:
+                # 加入了新的群
+                self.invalidate("groups")
+            else:
+                self._stale.add(("groups", event.group_id))
+
+    async def _load_friends(self) -> Dict[int, Friend]:
+        return {friend.uin: friend for friend in await self.api.get_friend_list() or ()}
+
+    async def _load_groups(self) -> Dict[int, Group]:
+        return {group.group_id: group for group in await self.api.get_group_list() or ()}
+
+    def _refresh(self, kind: str, id: int, value: Any) -> Any:
+        self._stale.discard((kind, id))
+        index = self._indexes.peek(kind)
+        if index is not None:
+            if value is None:
+                index.pop(id, None)
+            else:
+                index[id] = value
+        return value
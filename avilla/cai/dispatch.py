@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Literal, Set
+
+from cai.client.events import Event as CAIEvent
+from loguru import logger
+
+
+def scene_of(event: CAIEvent) -> int:
+    """Scene (group or contact) the event belongs to, 0 for account-wide events."""
+    for attr in ("group_id", "group", "from_uin", "uin"):
+        value = getattr(event, attr, None)
+        if value:
+            return int(value)
+    return 0
+
+
+class EventDispatcher:
+    """Bounded event queue of one account, drained by a fixed number of workers.
+
+    Events of the same scene always land on the same worker, so they are
+    handled in arrival order, while different scenes are handled in parallel.
+
+    cai runs every listener call as its own task, so blocking on a full queue
+    does not slow cai down, it only parks the event. With ``"block"`` at most
+    ``maxsize`` events are parked that way, events beyond are dropped.
+    """
+
+    handler: Callable[[CAIEvent], Awaitable[None]]
+    workers: int
+    maxsize: int
+    overflow: Literal["block", "drop"]
+
+    processed: int
+    failed: int
+    overflowed: int
+    dropped: int
+
+    def __init__(
+        self,
+        handler: Callable[[CAIEvent], Awaitable[None]],
+        workers: int = 4,
+        maxsize: int = 512,
+        overflow: Literal["block", "drop"] = "block",
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.processed = self.failed = self.overflowed = self.dropped = 0
+        self._blocked: Set[asyncio.Future] = set()
+        self._closing = False
+        self._queues: List[asyncio.Queue[CAIEvent]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def blocked(self) -> int:
+        """Events waiting for room in a full queue, not counted in ``depth``."""
+        return len(self._blocked)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "overflowed": self.overflowed,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+        }
+
+    def start(self):
+        if self._tasks:
+            return
+        self._closing = False
+        # maxsize <= 0 means unbounded, as with asyncio.Queue
+        lane_size = -(-self.maxsize // self.workers) if self.maxsize > 0 else 0
+        self._queues = [asyncio.Queue(lane_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    async def put(self, event: CAIEvent):
+        if not self._tasks:
+            raise RuntimeError("dispatcher is not running")
+        queue = self._queues[scene_of(event) % self.workers]
+        if not queue.full():
+            queue.put_nowait(event)
+            return
+        if self.overflow == "drop" or self.blocked >= self.maxsize:
+            self.dropped += 1
+            logger.warning(f"event queue is full, dropped {event.__class__.__name__}")
+            return
+        self.overflowed += 1
+        putter = asyncio.ensure_future(queue.put(event))
+        self._blocked.add(putter)
+        putter.add_done_callback(self._blocked.discard)
+        try:
+            await putter
+        except asyncio.CancelledError:
+            if not self._closing:
+                raise
+            self.dropped += 1
+
+    async def close(self, timeout: float | None = None):
+        """Wait for queued events to be handled, then stop the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.depth} queued events are discarded on close")
+        finally:
+            # parked events would wait on the dropped queues forever
+            self._closing = True
+            for task in (*self._blocked, *self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+            self._queues.clear()
+
+    async def _work(self, queue: asyncio.Queue[CAIEvent]):
+        while True:
+            event = await queue.get()
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"failed to handle {event.__class__.__name__}")
+            finally:
+                queue.task_done()
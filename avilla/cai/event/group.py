@@ -2,9 +2,7 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from avilla.core.context import Context
 from avilla.core.event import RelationshipCreated, RelationshipDestroyed
-from avilla.core.selector import Selector
 from avilla.core.trait.context import EventParserRecorder
 from cai.client.events.group import (
     GroupLuckyCharacterChangedEvent,
@@ -22,6 +20,8 @@ from cai.client.events.group import (
     TransferGroupEvent,
 )
 
+from ..selector import group_context
+
 if TYPE_CHECKING:
     from ..account import CAIAccount
     from ..protocol import CAIProtocol
@@ -33,15 +33,10 @@ event = EventParserRecorder["CAIProtocol", "CAIAccount"]
 async def group_member_joined_event(
     protocol: CAIProtocol, account: CAIAccount, raw: GroupMemberJoinedEvent
 ):
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    member = group.member(str(raw.uin))
-    context = Context(
-        account=account,
-        client=member,
-        endpoint=group,
-        scene=group,
-        selft=group.member(account.id),
-    )
+    group_id = str(raw.group_id)
+    member = account.connection.selectors.member(group_id, str(raw.uin))
+    context = group_context(account, group_id, member)
+    group = context.scene
     return RelationshipCreated(context, member, group, context.self), context
 
 
@@ -49,16 +44,11 @@ async def group_member_joined_event(
 async def group_member_leave_event(
     protocol: CAIProtocol, account: CAIAccount, raw: GroupMemberLeaveEvent
 ):
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    member = group.member(str(raw.uin))
-    context = Context(
-        account=account,
-        client=member,
-        endpoint=group,
-        scene=group,
-        selft=group.member(account.id),
-    )
+    group_id = str(raw.group_id)
+    member = account.connection.selectors.member(group_id, str(raw.uin))
+    context = group_context(account, group_id, member)
+    group = context.scene
     res = RelationshipDestroyed(context, member, group, context.self)
     if raw.operator and raw.operator != raw.uin:
-        res.mediums.append(group.member(str(raw.operator)))
+        res.mediums.append(account.connection.selectors.member(group_id, str(raw.operator)))
     return res, context
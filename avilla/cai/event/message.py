@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import TYPE_CHECKING
 
 from cai.client.events.common import (
@@ -10,15 +10,14 @@ from cai.client.events.common import (
     TempMessage,
 )
 from cai.client.events.group import GroupNudgeEvent, GroupMessageRecalledEvent
-from graia.amnesia.message import __message_chain_class__
-from graia.amnesia.builtins.memcache import Memcache
 from avilla.core.context import Context
 from avilla.core.message import Message
-from avilla.core.selector import Selector
 from avilla.core.trait.context import EventParserRecorder
 from avilla.spec.core.message import MessageReceived, MessageRevoked
 from avilla.spec.core.activity import ActivityTrigged
 
+from ..selector import friend_context, group_context
+
 if TYPE_CHECKING:
     from ..account import CAIAccount
     from ..protocol import CAIProtocol
@@ -28,30 +27,22 @@ event = EventParserRecorder["CAIProtocol", "CAIAccount"]
 
 @event("group_message")
 async def group_message(protocol: CAIProtocol, account: CAIAccount, raw: GroupMessage):
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    member = group.member(str(raw.from_uin))
-    context = Context(
-        account=account,
-        client=member,
-        endpoint=group,
-        scene=group,
-        selft=group.member(account.id),
-    )
-    message_result = await protocol.deserialize_message(context, raw.message)
+    group_id = str(raw.group_id)
+    member = account.connection.selectors.member(group_id, str(raw.from_uin))
+    context = group_context(account, group_id, member)
+    group = context.scene
+    content, reply = await protocol.deserialize_chain(context, raw.message)
     message = Message(
         describe=Message,
         id=str(raw.seq),  # id=message_result["source"],
         scene=group,
         sender=member,
-        content=__message_chain_class__(message_result["content"]),
+        content=content,
         time=datetime.fromtimestamp(raw.time),  # time=message_result["time"],
-        reply=group.message(str(message_result["reply"]))
-        if message_result["reply"]
-        else None,
+        reply=group.message(reply) if reply else None,
     )
     context._collect_metadatas(message, message)
-    memcache = context.avilla.launch_manager.get_interface(Memcache)
-    memcache.set(f"_cai_context.message.{message.id}", message, timedelta(seconds=300))
+    account.connection.messages.set(message)
     res = MessageReceived(context, message)
     return res, context
 
@@ -60,59 +51,47 @@ async def group_message(protocol: CAIProtocol, account: CAIAccount, raw: GroupMe
 async def friend_message(
     protocol: CAIProtocol, account: CAIAccount, raw: PrivateMessage
 ):
-    friend = Selector().land(protocol.land.name).friend(str(raw.from_uin))
-    context = Context(
-        account=account,
-        client=friend,
-        endpoint=account.to_selector(),
-        scene=friend,
-        selft=account.to_selector(),
-    )
-    message_result = await protocol.deserialize_message(context, raw.message)
+    context = friend_context(account, str(raw.from_uin))
+    friend = context.scene
+    content, reply = await protocol.deserialize_chain(context, raw.message)
     message = Message(
         describe=Message,
         id=str(raw.seq),
         scene=friend,
         sender=friend,
-        content=__message_chain_class__(message_result["content"]),
+        content=content,
         time=datetime.fromtimestamp(raw.time),  # time=message_result["time"],
-        reply=friend.message(str(message_result["reply"]))
-        if message_result["reply"]
-        else None,
+        reply=friend.message(reply) if reply else None,
     )
     context._collect_metadatas(message, message)
-    memcache = context.avilla.launch_manager.get_interface(Memcache)
-    memcache.set(f"_cai_context.message.{message.id}", message, timedelta(seconds=300))
+    account.connection.messages.set(message)
     res = MessageReceived(context, message)
     return res, context
 
 
 @event("temp_message")
 async def temp_message(protocol: CAIProtocol, account: CAIAccount, raw: TempMessage):
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    member = group.member(str(raw.from_uin))
+    pool = account.connection.selectors
+    member = pool.member(str(raw.group_id), str(raw.from_uin))
     context = Context(
         account=account,
         client=member,
         endpoint=member,
         scene=member,
-        selft=group.member(account.id),
+        selft=pool.self_in(str(raw.group_id)),
     )
-    message_result = await protocol.deserialize_message(context, raw.message)
+    content, reply = await protocol.deserialize_chain(context, raw.message)
     message = Message(
         describe=Message,
         id=str(raw.seq),  # id=message_result["source"],
         scene=member,
         sender=member,
-        content=__message_chain_class__(message_result["content"]),
+        content=content,
         time=datetime.fromtimestamp(raw.time),  # time=message_result["time"],
-        reply=member.message(str(message_result["reply"]))
-        if message_result["reply"]
-        else None,
+        reply=member.message(reply) if reply else None,
     )
     context._collect_metadatas(message, message)
-    memcache = context.avilla.launch_manager.get_interface(Memcache)
-    memcache.set(f"_cai_context.message.{message.id}", message, timedelta(seconds=300))
+    account.connection.messages.set(message)
     res = MessageReceived(context, message)
     return res, context
 
@@ -121,32 +100,22 @@ async def temp_message(protocol: CAIProtocol, account: CAIAccount, raw: TempMess
 async def nudge_event(
     protocol: CAIProtocol, account: CAIAccount, raw: NudgeEvent
 ):
-    nudge_id = Selector().land(protocol.land.name).activity("nudge_trigger")
-    nudge_activity = Selector().land(protocol.land.name).nudge(raw.action)
+    pool = account.connection.selectors
+    nudge_id = pool.root.activity("nudge_trigger")
+    nudge_activity = pool.root.nudge(raw.action)
     if raw.group:
-        group = Selector().land(protocol.land.name).group(str(raw.group))
-        target = group.member(str(raw.target))
-        sender = group.member(str(raw.sender))
-        context = Context(
-            account=account,
-            client=sender,
-            endpoint=target,
-            scene=group,
-            selft=group.member(account.id),
-        )
+        group_id = str(raw.group)
+        target = pool.member(group_id, str(raw.target))
+        sender = pool.member(group_id, str(raw.sender))
+        context = group_context(account, group_id, sender, target)
+        group = context.scene
 
         nudge = ActivityTrigged(context, nudge_id, nudge_activity)
         nudge.trigger = sender
         nudge.scene = group
     else:
-        friend = Selector().land(protocol.land.name).friend(str(raw.sender))
-        context = Context(
-            account=account,
-            client=friend,
-            endpoint=account.to_selector(),
-            scene=friend,
-            selft=account.to_selector(),
-        )
+        context = friend_context(account, str(raw.sender))
+        friend = context.scene
         nudge = ActivityTrigged(context, nudge_id, nudge_activity)
         nudge.trigger = friend
         nudge.scene = friend
@@ -183,24 +152,14 @@ async def group_nudge_event(
     )
 
     """
-    nudge_id = Selector().land(protocol.land.name).activity("nudge_trigger")
-    nudge_activity = (
-        Selector()
-        .land(protocol.land.name)
-        .nudge(str(raw.template_id))
-        .action(raw.action_text)
-        .suffix(raw.suffix_text)
-    )
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    target = group.member(str(raw.receiver_id))
-    sender = group.member(str(raw.sender_id))
-    context = Context(
-        account=account,
-        client=sender,
-        endpoint=target,
-        scene=group,
-        selft=group.member(account.id),
-    )
+    pool = account.connection.selectors
+    nudge_id = pool.root.activity("nudge_trigger")
+    nudge_activity = pool.root.nudge(str(raw.template_id)).action(raw.action_text).suffix(raw.suffix_text)
+    group_id = str(raw.group_id)
+    target = pool.member(group_id, str(raw.receiver_id))
+    sender = pool.member(group_id, str(raw.sender_id))
+    context = group_context(account, group_id, sender, target)
+    group = context.scene
     nudge = ActivityTrigged(context, nudge_id, nudge_activity)
     nudge.trigger = sender
     nudge.scene = group
@@ -211,14 +170,9 @@ async def group_nudge_event(
 async def group_message_recall(
     protocol: CAIProtocol, account: CAIAccount, raw: GroupMessageRecalledEvent
 ):
-    group = Selector().land(protocol.land.name).group(str(raw.group_id))
-    member = group.member(str(raw.operator_id))
-    context = Context(
-        account=account,
-        client=member,
-        endpoint=group,
-        scene=group,
-        selft=group.member(account.id),
-    )
+    group_id = str(raw.group_id)
+    member = account.connection.selectors.member(group_id, str(raw.operator_id))
+    context = group_context(account, group_id, member)
+    group = context.scene
     message = group.message(str(raw.msg_seq)).message(str(raw.msg_seq)).time(str(raw.msg_time))
     return MessageRevoked(context, message, member), context
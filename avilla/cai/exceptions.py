@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+from graia.amnesia.message.element import Element
+
+
+class MessageSerializeError(Exception):
+    """Several elements of a message could not be converted to CAI elements.
+
+    A single failing element raises its own exception instead.
+    """
+
+    errors: List[Tuple[int, Element, BaseException]]
+
+    def __init__(self, errors: List[Tuple[int, Element, BaseException]]):
+        self.errors = errors
+        super().__init__(
+            "; ".join(f"#{index} {element.__class__.__name__}: {error!r}" for index, element, error in errors)
+        )
+
+
+class ResourceTooLarge(Exception):
+    """The resource exceeds ``CAIConfig.fetch_max_size``."""
+
+
+class AccountOffline(Exception):
+    """The account is offline and did not come back within ``CAIConfig.offline_send_timeout``."""
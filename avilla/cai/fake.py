@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import IO, Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from cai.client.events import Event as CAIEvent
+
+EventListener = Callable[[Any, CAIEvent], Awaitable[None]]
+
+
+class InjectedFailure(ConnectionError):
+    """Raised by ``FakeClient`` calls picked for failure injection."""
+
+
+class _FakeSession:
+    def __init__(self, client: FakeClient):
+        self._client = client
+
+    async def close(self):
+        await self._client._call("session.close")
+        self._client.connected = False
+
+
+class FakeClient:
+    """Offline stand-in for the part of ``cai.Client`` used by this adapter.
+
+    Every call waits ``latency`` seconds (a fixed value or a ``(low, high)``
+    range) and fails with ``InjectedFailure`` at ``failure_rate``, which can be
+    overridden per method in ``failures``. Groups, members and friends are
+    generated, sends and uploads are recorded in ``sent``.
+    """
+
+    def __init__(
+        self,
+        uin: int,
+        password: str = "",
+        protocol: str = "IPAD",
+        *,
+        groups: int = 8,
+        members: int = 200,
+        friends: int = 50,
+        latency: Union[float, Tuple[float, float]] = 0.0,
+        failure_rate: float = 0.0,
+        failures: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.uin = uin
+        self.connected = False
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failures = failures or {}
+        self.session = _FakeSession(self)
+        self.calls: Dict[str, int] = {}
+        self.sent: Deque[Tuple[str, Any, Any]] = deque(maxlen=1024)
+        self._listeners: List[EventListener] = []
+        self._random = random.Random(seed)
+        self._seq = itertools.count(1)
+        self._tasks: set = set()
+        self._groups = {
+            group_id: SimpleNamespace(group_id=group_id, group_name=f"group {group_id}", group_memo="")
+            for group_id in range(100000, 100000 + groups)
+        }
+        self._members = {
+            group_id: [self._member(group, uin) for uin in range(200000, 200000 + members)]
+            for group_id, group in self._groups.items()
+        }
+        self._friends = {
+            uin: SimpleNamespace(uin=uin, nick=f"friend {uin}", remark="", term_description="")
+            for uin in range(300000, 300000 + friends)
+        }
+
+    @staticmethod
+    def _member(group: Any, uin: int) -> SimpleNamespace:
+        return SimpleNamespace(
+            uin=uin,
+            member_uin=uin,
+            group=group,
+            nick=f"nick {uin}",
+            name="",
+            member_card=f"card {uin}",
+            special_title="",
+            memo="",
+            role=SimpleNamespace(value="member"),
+            shutup_timestamp=0,
+        )
+
+    async def _call(self, method: str):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if self._random.random() < self.failures.get(method, self.failure_rate):
+            raise InjectedFailure(f"injected failure of {method}")
+
+    # ---- events ----
+
+    def add_event_listener(self, listener: EventListener):
+        self._listeners.append(listener)
+
+    def emit(self, event: CAIEvent):
+        """Dispatch ``event`` to the listeners, as cai does for received packets."""
+        for listener in self._listeners:
+            task = asyncio.create_task(listener(self, event))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    # ---- login ----
+
+    async def login(self):
+        await self._call("login")
+        self.connected = True
+
+    async def token_login(self, sig: bytes):
+        await self._call("token_login")
+        self.connected = True
+
+    def dump_sig(self) -> bytes:
+        return f"fake-sig-{self.uin}".encode()
+
+    # ---- contacts ----
+
+    async def get_group(self, group_id: int) -> Any:
+        await self._call("get_group")
+        return self._groups.get(group_id)
+
+    async def get_group_list(self) -> list:
+        await self._call("get_group_list")
+        return list(self._groups.values())
+
+    async def get_group_member_list(self, group_id: int) -> Optional[list]:
+        await self._call("get_group_member_list")
+        return self._members.get(group_id)
+
+    async def get_friend(self, uin: int) -> Any:
+        await self._call("get_friend")
+        return self._friends.get(uin)
+
+    async def get_friend_list(self) -> list:
+        await self._call("get_friend_list")
+        return list(self._friends.values())
+
+    # ---- messages ----
+
+    async def send_group_msg(self, group_id: int, elements: list) -> Tuple[int, int, int]:
+        await self._call("send_group_msg")
+        self.sent.append(("group", group_id, elements))
+        return next(self._seq), self._random.randrange(1 << 31), int(time.time())
+
+    async def send_friend_msg(self, uin: int, elements: list) -> Tuple[int, int, int]:
+        await self._call("send_friend_msg")
+        self.sent.append(("friend", uin, elements))
+        return next(self._seq), self._random.randrange(1 << 31), int(time.time())
+
+    async def recall_group_msg(self, group_id: int, message: Tuple[int, int, int]):
+        await self._call("recall_group_msg")
+
+    async def recall_friend_msg(self, uin: int, message: Tuple[int, int, int]):
+        await self._call("recall_friend_msg")
+
+    async def upload_image(self, group_id: int, file: IO[bytes], is_emoji: bool = False) -> Any:
+        await self._call("upload_image")
+        data = file.read()
+        self.sent.append(("upload_image", group_id, len(data)))
+        return SimpleNamespace(type="image", filename="fake.png", size=len(data), url="", is_emoji=is_emoji)
+
+    async def upload_voice(self, group_id: int, file: IO[bytes]) -> Any:
+        await self._call("upload_voice")
+        data = file.read()
+        self.sent.append(("upload_voice", group_id, len(data)))
+        return SimpleNamespace(type="voice", file_name="fake.amr", size=len(data), url="")
+
+    async def upload_video(self, group_id: int, file: IO[bytes], thumb: IO[bytes]) -> Any:
+        await self._call("upload_video")
+        data = file.read()
+        self.sent.append(("upload_video", group_id, len(data)))
+        return SimpleNamespace(type="video", file_name="fake.mp4", file_size=len(data))
+
+    # ---- group management ----
+
+    async def mute_member(self, group_id: int, uin: int, duration: int):
+        await self._call("mute_member")
+
+    async def set_group_admin(self, group_id: int, uin: int, is_admin: bool):
+        await self._call("set_group_admin")
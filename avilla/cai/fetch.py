@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from hashlib import md5
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import IO, TYPE_CHECKING, Tuple
+
+import aiohttp
+from graia.amnesia.builtins.aiohttp import AiohttpClientInterface
+from loguru import logger
+
+from .exceptions import ResourceTooLarge
+
+if TYPE_CHECKING:
+    from avilla.core.context import Context
+
+    from .client import CAIClient
+    from .config import CAIConfig
+    from .resource import CAIResource
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+async def stream_resource(ctx: Context, url: str, config: CAIConfig) -> Tuple[IO[bytes], bytes]:
+    """Download url in chunks into a spooled temp file.
+
+    Returns the file, rewound, and the md5 digest of its content. The caller
+    owns the file and should close it.
+    """
+    # the aiohttp session of the service is shared, so connections are reused
+    session: aiohttp.ClientSession = ctx.avilla.launch_manager.get_interface(AiohttpClientInterface).service.session
+    timeout = aiohttp.ClientTimeout(total=config.fetch_timeout)
+    attempt = 0
+    while True:
+        file = SpooledTemporaryFile(config.fetch_spool_threshold)
+        digest = md5()
+        try:
+            async with session.get(url, timeout=timeout) as response:
+                response.raise_for_status()
+                if config.fetch_max_size and (response.content_length or 0) > config.fetch_max_size:
+                    raise ResourceTooLarge(f"{url} has {response.content_length} bytes")
+                size = 0
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if config.fetch_max_size and size > config.fetch_max_size:
+                        raise ResourceTooLarge(f"{url} exceeds {config.fetch_max_size} bytes")
+                    digest.update(chunk)
+                    file.write(chunk)
+            file.seek(0)
+            return file, digest.digest()
+        except Exception as e:
+            file.close()
+            if attempt >= config.fetch_retries or not _retryable(e):
+                raise
+            delay = config.fetch_backoff * 2**attempt * (1 + random.random())
+            attempt += 1
+            logger.debug(f"failed to fetch {url} ({e!r}), retry #{attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def open_resource(ctx: Context, res: CAIResource, connection: CAIClient) -> Tuple[IO[bytes], bytes]:
+    """Like stream_resource, but served from the resource cache of the account when possible."""
+    assert res.url
+    cache = connection.resources
+    key = f"{res.type}/{res.id}"
+    data = await cache.get(key)
+    if data is not None:
+        return BytesIO(data), md5(data).digest()
+    file, digest = await stream_resource(ctx, res.url, connection.config)
+    size = file.seek(0, 2)
+    file.seek(0)
+    if size <= cache.item_size:
+        data = file.read()
+        file.seek(0)
+        await cache.put(key, data)
+    return file, digest
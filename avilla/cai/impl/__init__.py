@@ -2,12 +2,11 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from graia.amnesia.builtins.aiohttp import AiohttpClientInterface
-
 from avilla.core.trait.context import bounds, fetch, get_artifacts
 from avilla.core.trait.signature import CompleteRule
+from avilla.cai.account import CAIAccount
+from avilla.cai.fetch import open_resource
 from avilla.cai.resource import CAIImageResource, CAIAudioResource, CAIResource
-from loguru import logger
 
 
 if TYPE_CHECKING:
@@ -22,7 +21,7 @@ with bounds("group"):
 async def fetch_from_url(ctx: Context, res: CAIResource) -> bytes:
     if not res.url:
         raise NotImplementedError
-    logger.debug(ctx.avilla.launch_manager._service_bind)
-    client = ctx.avilla.launch_manager.get_interface(AiohttpClientInterface)
-    # NOTE: wait for amnesia's fix on this.
-    return await (await client.request("GET", res.url)).io().read()
+    assert isinstance(ctx.account, CAIAccount)
+    file, _ = await open_resource(ctx, res, ctx.account.connection)
+    with file:
+        return file.read()
@@ -5,6 +5,8 @@ from avilla.core.context import Context
 from avilla.core.selector import Selector
 from avilla.core.trait.context import ContextSourceRecorder
 
+from ..selector import group_context
+
 if TYPE_CHECKING:
     from ..account import CAIAccount
 
@@ -13,21 +15,23 @@ _source_record = ContextSourceRecorder["ElizabethAccount"]
 
 @_source_record("friend")
 async def get_friend_context(account: CAIAccount, target: Selector, *, via: Selector | None = None) -> Context:
-    friend = target.land(account.land)
-    return Context(account, account.to_selector(), friend, friend, account.to_selector(), [via] if via else [])
+    pool = account.connection.selectors
+    friend = pool.friend(str(target.pattern["friend"]))
+    return Context(account, pool.account, friend, friend, pool.account, [via] if via else [])
 
 
 @_source_record("group")
 async def get_group_context(account: CAIAccount, target: Selector, *, via: Selector | None = None) -> Context:
-    group = target.land(account.land)
-    selft = group.member(account.id)
-    return Context(account, selft, group, group, selft, [via] if via else [])
+    group_id = str(target.pattern["group"])
+    return group_context(account, group_id, account.connection.selectors.self_in(group_id), None, [via] if via else [])
 
 
 @_source_record("group.member")
 async def get_group_member_context(
     account: CAIAccount, target: Selector, *, via: Selector | None = None
 ) -> Context:
-    group = Selector().land(account.land).group(target["group"])
-    selft = group.member(account.id)
-    return Context(account, selft, target.land(account.land), group, selft, [via] if via else [])
+    pool = account.connection.selectors
+    group_id = str(target.pattern["group"])
+    member = pool.member(group_id, str(target.pattern["member"]))
+    selft = pool.self_in(group_id)
+    return Context(account, selft, member, pool.group(group_id), selft, [via] if via else [])
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
+from functools import partial
 
 from loguru import logger
 from typing import TYPE_CHECKING
-from contextlib import suppress
 from cai.client.models import Friend
-from graia.amnesia.builtins.memcache import Memcache
 from avilla.cai.account import CAIAccount
 
 
@@ -32,13 +32,19 @@ with bounds("friend"):
         if TYPE_CHECKING:
             assert isinstance(ctx.protocol, CAIProtocol)
         assert isinstance(ctx.account, CAIAccount)
+        await ctx.account.connection.ensure_online()
         serialized_msg = await ctx.protocol.serialize_message(message, ctx, reply=reply)
-        result = await ctx.account.client.send_friend_msg(
-            int(target.pattern["friend"]), serialized_msg
+        friend_id = int(target.pattern["friend"])
+        started = time.perf_counter()
+        result, message = await ctx.account.connection.outbound.submit(
+            ("friend", friend_id),
+            serialized_msg,
+            partial(ctx.account.client.send_friend_msg, friend_id),
+            content=message,
+            priority=reply is not None,
         )
-        name = ""
-        with suppress(NotImplementedError):
-            name = (await ctx.pull(Summary, target)).name
+        ctx.protocol.metrics.observe("send", ctx.account.id, "friend", time.perf_counter() - started)
+        name = ctx.account.connection.resolve_name(ctx, target)
         logger.info(  # TODO: wait for solution of ActiveMessage
             f"{ctx.account.land.name}: [send]"
             f"[Friend({f'{name}, ' if name else ''}{target.pattern['friend']})]"
@@ -54,8 +60,7 @@ with bounds("friend"):
         )
         message_selector = message_metadata.to_selector().random(str(result[1])).time(str(result[2]))
         ctx._collect_metadatas(message_selector, message_metadata)
-        memcache = ctx.avilla.launch_manager.get_interface(Memcache)
-        memcache.set(f"_cai_context.message.{message_metadata.id}", message, timedelta(seconds=300))
+        ctx.account.connection.messages.set(message_metadata)
         return message_selector
 
 
@@ -63,7 +68,7 @@ with bounds("friend"):
     async def get_friend_nick(ctx: Context, target: Selector | None) -> Nick:
         assert target is not None
         assert isinstance(ctx.account, CAIAccount)
-        friend = await ctx.account.client.get_friend(int(target.pattern["friend"]))
+        friend = await ctx.account.connection.contacts.friend(int(target.pattern["friend"]))
         assert isinstance(friend, Friend)
         return Nick(Nick, friend.nick, friend.remark, "")
 
@@ -71,7 +76,7 @@ with bounds("friend"):
     async def get_summary(ctx: Context, target: Selector | None) -> Summary:
         assert target is not None
         assert isinstance(ctx.account, CAIAccount)
-        friend = await ctx.account.client.get_friend(int(target.pattern["friend"]))
+        friend = await ctx.account.connection.contacts.friend(int(target.pattern["friend"]))
         assert isinstance(friend, Friend)
         return Summary(
             describe=Summary, name=friend.nick, description=friend.term_description
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from datetime import timedelta, datetime
+import time
+from datetime import datetime
+from functools import partial
 from typing import TYPE_CHECKING 
-from cai.client.models import Group, GroupMember
-from graia.amnesia.builtins.memcache import Memcache
+from cai.client.models import Group
 from avilla.core.message import Message
 from avilla.core.metadata import MetadataOf
 from avilla.core.selector import Selector
@@ -30,11 +31,18 @@ with bounds("group"):
         if TYPE_CHECKING:
             assert isinstance(ctx.protocol, CAIProtocol)
         assert isinstance(ctx.account, CAIAccount)
+        await ctx.account.connection.ensure_online()
         serialized_msg = await ctx.protocol.serialize_message(message, ctx, reply=reply)
-        result = await ctx.account.client.send_group_msg(
-            int(target.pattern["group"]),
-            serialized_msg
+        group_id = int(target.pattern["group"])
+        started = time.perf_counter()
+        result, message = await ctx.account.connection.outbound.submit(
+            ("group", group_id),
+            serialized_msg,
+            partial(ctx.account.client.send_group_msg, group_id),
+            content=message,
+            priority=reply is not None,
         )
+        ctx.protocol.metrics.observe("send", ctx.account.id, "group", time.perf_counter() - started)
         message_metadata = Message(
             describe=Message,
             id=str(result[0]),
@@ -45,8 +53,7 @@ with bounds("group"):
         )
         message_selector = message_metadata.to_selector().random(str(result[1])).time(str(result[2]))
         ctx._collect_metadatas(message_selector, message_metadata)
-        memcache = ctx.avilla.launch_manager.get_interface(Memcache)
-        memcache.set(f"_cai_context.message.{message_metadata.id}", message, timedelta(seconds=300))
+        ctx.account.connection.messages.set(message_metadata)
         return message_selector
 
 
@@ -78,7 +85,7 @@ with bounds("group"):
     async def get_summary(ctx: Context, target: Selector | None) -> Summary:
         assert target is not None
         assert isinstance(ctx.account, CAIAccount)
-        group = await ctx.account.client.get_group(int(target.pattern["group"]))
+        group = await ctx.account.connection.contacts.group(int(target.pattern["group"]))
         assert isinstance(group, Group)
         return Summary(describe=Summary, name=group.group_name, description=group.group_memo)
 
@@ -90,21 +97,15 @@ with bounds("group"):
     @pull(Summary)
     async def get_summary(ctx: Context, target: Selector | None) -> Summary:
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(int(ctx.self.pattern["group"]))
-        try:
-            self = next(filter(lambda x: x.uin == int(ctx.self.pattern["member"]), result))
-        except StopIteration as e:
-            raise RuntimeError from e
+        roster = ctx.account.connection.roster
         if not target:
+            self = await roster.get(int(ctx.self.pattern["group"]), int(ctx.self.pattern["member"]))
             return Summary(
                 Summary,
                 self.member_card,
                 self.memo
             )
-        try:
-            member = next(filter(lambda x: x.uin == int(target.pattern["member"]), result))
-        except StopIteration as e:
-            raise RuntimeError from e
+        member = await roster.get(int(ctx.self.pattern["group"]), int(target.pattern["member"]))
         return Summary(
                 Summary,
                 member.member_card,
@@ -114,21 +115,15 @@ with bounds("group"):
     @pull(Privilege)
     async def group_get_privilege_info(ctx: Context, target: Selector | None) -> Privilege:
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(int(ctx.self.pattern["group"]))
-        try:
-            self = next(filter(lambda x: x.uin == int(ctx.account.id), result))
-        except StopIteration as e:
-            raise RuntimeError from e
+        roster = ctx.account.connection.roster
+        self = await roster.get(int(ctx.self.pattern["group"]), int(ctx.account.id))
         if target is None:
             return Privilege(
                 Privilege,
                 self.role.value in {"owner", "admin"},
                 self.role.value in {"owner", "admin"},
             )
-        try:
-            member = next(filter(lambda x: x.uin == int(target.pattern["member"]), result))
-        except StopIteration as e:
-            raise RuntimeError from e
+        member = await roster.get(int(ctx.self.pattern["group"]), int(target.pattern["member"]))
         return Privilege(
             Privilege,
             self.role.value in {"owner", "admin"},
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Dict, Iterable, List, Type, TypeVar
+
+from cai.client.models import GroupMember
 
 from avilla.cai.account import CAIAccount
 from avilla.core.exceptions import permission_error_message
@@ -14,7 +17,6 @@ from avilla.spec.core.privilege.metadata import MuteInfo
 from avilla.spec.core.privilege.skeleton import PrivilegeTrait
 from avilla.spec.core.profile import Nick, Summary
 from avilla.spec.core.scene.skeleton import SceneTrait
-from cai.client.models import GroupMember
 
 if TYPE_CHECKING:
     from avilla.core.context import Context
@@ -25,21 +27,72 @@ privilege_trans = defaultdict(
 )
 privilege_level = defaultdict(lambda: 0, {"owner": 2, "admin": 1})
 
+M = TypeVar("M", Nick, Summary, Privilege)
+
+
+def member_nick(member: GroupMember) -> Nick:
+    return Nick(Nick, member.name or member.nick, member.member_card, member.special_title)
+
+
+def member_summary(member: GroupMember) -> Summary:
+    return Summary(Summary, member.member_card, member.memo)
+
+
+def member_privilege(self: GroupMember, member: GroupMember) -> Privilege:
+    return Privilege(
+        Privilege,
+        privilege_level[self.role.value] > 0,
+        privilege_level[self.role.value] > privilege_level[member.role.value],
+    )
+
+
+async def pull_members(ctx: Context, metadata: Type[M], targets: Iterable[Selector]) -> List[M]:
+    """Pull Nick, Summary or Privilege of many group members at once.
+
+    Each group involved is fetched once, the results are in the order of
+    ``targets`` and are cached in ``ctx`` like single pulls.
+    """
+    assert isinstance(ctx.account, CAIAccount)
+    if metadata not in (Nick, Summary, Privilege):
+        raise TypeError(f"batch pull of {metadata!r} is not supported")
+    targets = list(targets)
+    roster = ctx.account.connection.roster
+    group_ids = list({int(target.pattern["group"]) for target in targets})
+    groups: Dict[int, Dict[int, GroupMember]] = dict(
+        zip(group_ids, await asyncio.gather(*(roster.fetch(group_id) for group_id in group_ids)))
+    )
+
+    def member_of(group_id: int, uin: int) -> GroupMember:
+        try:
+            return groups[group_id][uin]
+        except KeyError as e:
+            raise RuntimeError(f"member {uin} not found in group {group_id}") from e
+
+    self_id = int(ctx.account.id)
+    results = []
+    for target in targets:
+        group_id = int(target.pattern["group"])
+        member = member_of(group_id, int(target.pattern["member"]))
+        if metadata is Nick:
+            result = member_nick(member)
+        elif metadata is Summary:
+            result = member_summary(member)
+        else:
+            result = member_privilege(member_of(group_id, self_id), member)
+        ctx._collect_metadatas(target, result)
+        results.append(result)
+    return results  # type: ignore
+
+
 with bounds("group.member"):
 
     @pull(MuteInfo)
     async def get_member_mute_info(ctx: Context, target: Selector):
         assert target is not None
         assert isinstance(ctx.account, CAIAccount)
-        members: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
+        result = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
-        try:
-            result = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), members)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
         now = datetime.now()
         return MuteInfo(
             MuteInfo,
@@ -88,37 +141,18 @@ with bounds("group.member"):
     @pull(Summary)
     async def get_member_summary(ctx: Context, target: Selector) -> Summary:
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
+        member = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
-        try:
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
-        return Summary(Summary, member.member_card, member.memo)
+        return member_summary(member)
 
     @pull(Privilege)
     async def get_member_privilege(ctx: Context, target: Selector):
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
-        )
-        try:
-            self = next(
-                filter(lambda x: x.uin == int(ctx.self.pattern["member"]), result)
-            )
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
-        return Privilege(
-            Privilege,
-            privilege_level[self.role.value] > 0,
-            privilege_level[self.role.value] > privilege_level[member.role.value],
-        )
+        roster = ctx.account.connection.roster
+        self = await roster.get(int(target.pattern["group"]), int(ctx.self.pattern["member"]))
+        member = await roster.get(int(target.pattern["group"]), int(target.pattern["member"]))
+        return member_privilege(self, member)
 
     @pull(Privilege >> Summary)
     async def get_member_privilege_summary_info(
@@ -126,29 +160,17 @@ with bounds("group.member"):
     ) -> Summary:
         assert isinstance(ctx.account, CAIAccount)
         if not target:
-            result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-                int(ctx.self.pattern["group"])
+            self = await ctx.account.connection.roster.get(
+                int(ctx.self.pattern["group"]), int(ctx.self.pattern["member"])
             )
-            try:
-                self = next(
-                    filter(lambda x: x.uin == int(ctx.self.pattern["member"]), result)
-                )
-            except StopIteration as e:
-                raise RuntimeError from e
             return Summary(
                 Privilege >> Summary,
                 privilege_trans[self.role.value],
                 "the permission info of current account in the group",
             )
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
+        member = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
-        try:
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
         return Summary(
             Privilege >> Summary,
             privilege_trans[member.role.value],
@@ -158,15 +180,9 @@ with bounds("group.member"):
     @pull(Privilege >> Privilege)
     async def get_member_privilege_of_privilege(ctx: Context, target: Selector):
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
+        member = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
-        try:
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
         return Privilege(
             Privilege >> Privilege,
             privilege_level[member.role.value] == 2,
@@ -176,15 +192,9 @@ with bounds("group.member"):
     @pull(Privilege >> Privilege >> Summary)
     async def get_member_privilege_of_privilege_summary(ctx: Context, target: Selector):
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
+        member = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
-        try:
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
         return Summary(
             Privilege >> Privilege >> Summary,
             privilege_trans[member.role.value],
@@ -232,18 +242,10 @@ with bounds("group.member"):
     @pull(Nick)
     async def get_member_nick(ctx: Context, target: Selector) -> Nick:
         assert isinstance(ctx.account, CAIAccount)
-        result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-            int(target.pattern["group"])
-        )
-        try:
-            member = next(
-                filter(lambda x: x.uin == int(target.pattern["member"]), result)
-            )
-        except StopIteration as e:
-            raise RuntimeError from e
-        return Nick(
-            Nick, member.name or member.nick, member.member_card, member.special_title
+        member = await ctx.account.connection.roster.get(
+            int(target.pattern["group"]), int(target.pattern["member"])
         )
+        return member_nick(member)
 
 
 #
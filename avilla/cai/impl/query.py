@@ -1,43 +1,71 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional
 
 from avilla.cai.account import CAIAccount
 from avilla.core.selector import Selector
 from avilla.core.trait.context import query
-from cai.client.models import Friend, Group, GroupMember
 
 if TYPE_CHECKING:
     from avilla.core.context import Context
 
 
+def _exact(predicate: Selector, key: str) -> Optional[int]:
+    value = predicate.pattern.get(key)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+
+
+def _select(
+    index: Dict[int, Any], predicate: Selector, key: str, build: Callable[[int], Selector]
+) -> Iterator[Selector]:
+    # 谓词给出了确切的 id 时直接查索引, 否则逐个构造并匹配
+    id = _exact(predicate, key)
+    if id is not None:
+        ids = (id,) if id in index else ()
+    else:
+        ids = index
+    for id in ids:
+        selector = build(id)
+        if predicate.match(selector):
+            yield selector
+
+
 @query("friend")
 async def get_friends(ctx: Context, upper: None, predicate: Selector):
     assert isinstance(ctx.account, CAIAccount)
-    result: list[Friend] = await ctx.account.client.get_friend_list()
-    for i in result:
-        friend = Selector().friend(str(i.uin))
-        if predicate.match(friend):
-            yield friend
+    contacts = ctx.account.connection.contacts
+    uin = _exact(predicate, "friend")
+    if uin is not None:
+        # 不在缓存的列表里时单独查一次, 可能是刚加的好友
+        if await contacts.friend(uin) is not None:
+            friend = Selector().friend(str(uin))
+            if predicate.match(friend):
+                yield friend
+        return
+    for friend in _select(await contacts.friends(), predicate, "friend", lambda uin: Selector().friend(str(uin))):
+        yield friend
 
 
 @query("group")
 async def get_groups(ctx: Context, upper: None, predicate: Selector):
     assert isinstance(ctx.account, CAIAccount)
-    result: list[Group] = await ctx.account.client.get_group_list()
-    for i in result:
-        group = Selector().group(str(i.group_id))
-        if predicate.match(group):
-            yield group
+    contacts = ctx.account.connection.contacts
+    group_id = _exact(predicate, "group")
+    if group_id is not None:
+        if await contacts.group(group_id) is not None:
+            group = Selector().group(str(group_id))
+            if predicate.match(group):
+                yield group
+        return
+    for group in _select(await contacts.groups(), predicate, "group", lambda group_id: Selector().group(str(group_id))):
+        yield group
 
 
 @query("group", "member")
 async def get_group_members(ctx: Context, upper: Selector, predicate: Selector):
     assert isinstance(ctx.account, CAIAccount)
-    result: list[GroupMember] = await ctx.account.client.get_group_member_list(
-        int(upper.pattern["group"])
-    )
-    for i in result:
-        member = Selector().group(str(i.group.group_id)).member(str(i.member_uin))
-        if predicate.match(member):
-            yield member
+    group = str(upper.pattern["group"])
+    members = await ctx.account.connection.roster.fetch(int(group))
+    for member in _select(members, predicate, "member", lambda uin: Selector().group(group).member(str(uin))):
+        yield member
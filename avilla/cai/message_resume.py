@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import time
+from hashlib import md5
 from io import BytesIO
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING, Awaitable, Callable, TypeVar
 
 from avilla.cai.account import CAIAccount
 from avilla.cai.element import Custom, Emoji, Face, Flash, Shake
+from avilla.cai.fetch import open_resource
+from avilla.cai.resource import CAIResource
 from avilla.cai.trait import resume
 from avilla.core.elements import Audio, Notice, NoticeAll, Picture, Video
 from avilla.core.exceptions import UnsupportedOperation
+from avilla.core.resource import Resource
 from cai.client.message_service.models import (
     AtAllElement,
     AtElement,
@@ -21,6 +26,8 @@ from graia.amnesia.message.element import Text
 if TYPE_CHECKING:
     from avilla.core.context import Context
 
+T = TypeVar("T")
+
 
 @resume(Text)
 async def plain(context: Context, element: Text):
@@ -42,57 +49,141 @@ async def face(context: Context, element: Face):
     return FaceElement(element.id)
 
 
+class _FileView:
+    """Second read handle on a file, with its own position and no copy."""
+
+    def __init__(self, file: IO[bytes]):
+        self._file = file
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        saved = self._file.tell()
+        try:
+            self._file.seek(self._pos)
+            data = self._file.read(size)
+        finally:
+            self._file.seek(saved)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 2:
+            saved = self._file.tell()
+            offset += self._file.seek(0, 2)
+            self._file.seek(saved)
+        elif whence == 1:
+            offset += self._pos
+        self._pos = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        # the file itself is closed by its owner
+        pass
+
+
+async def _upload(
+    context: Context,
+    resource: Resource,
+    kind: str,
+    upload: Callable[[int, IO[bytes]], Awaitable[T]],
+    unsupported: str,
+) -> T:
+    assert isinstance(context.account, CAIAccount)
+    if not (gid := context.scene.pattern.get("group")):
+        raise UnsupportedOperation(unsupported)
+    gid = int(gid)
+    connection = context.account.connection
+    cache = connection.uploads
+    digest = cache.digest_of(resource)
+    if digest is not None and (element := cache.get(digest, gid, kind)) is not None:
+        return element
+    if isinstance(resource, CAIResource) and resource.url:
+        file, digest = await open_resource(context, resource, connection)
+    else:
+        raw = await context.fetch(resource)
+        file, digest = BytesIO(raw), md5(raw).digest()
+    with file:
+        cache.remember(resource, digest)
+        if (element := cache.get(digest, gid, kind)) is not None:
+            return element
+        started = time.perf_counter()
+        element = await upload(gid, file)
+        context.protocol.metrics.observe("upload", context.account.id, kind, time.perf_counter() - started)
+    cache.set(digest, gid, kind, element)
+    return element
+
+
 @resume(Picture)
 async def image(context: Context, element: Picture):
     assert isinstance(context.account, CAIAccount)
-    raw = await context.fetch(element.resource)
-    scene = context.scene
-    if not (gid := scene.pattern.get("group")):
-        raise UnsupportedOperation("current cai can only send image in group")
-    return await context.account.client.upload_image(int(gid), BytesIO(raw))
+    client = context.account.client
+    return await _upload(
+        context,
+        element.resource,
+        "image",
+        client.upload_image,
+        "current cai can only send image in group",
+    )
 
 
 @resume(Emoji)
 async def emoji(context: Context, element: Emoji):
     assert isinstance(context.account, CAIAccount)
-    raw = await context.fetch(element.resource)
-    scene = context.scene
-    if not (gid := scene.pattern.get("group")):
-        raise UnsupportedOperation("current cai can only send image in group")
-    return await context.account.client.upload_image(int(gid), BytesIO(raw), True)
+    client = context.account.client
+    return await _upload(
+        context,
+        element.resource,
+        "emoji",
+        lambda gid, file: client.upload_image(gid, file, True),
+        "current cai can only send image in group",
+    )
 
 
 @resume(Flash)
 async def flash_image(context: Context, element: Flash):
     assert isinstance(context.account, CAIAccount)
-    raw = await context.fetch(element.resource)
-    scene = context.scene
-    if not (gid := scene.pattern.get("group")):
-        raise UnsupportedOperation("current cai can only send flash-image in group")
+    client = context.account.client
     return (
-        await context.account.client.upload_image(int(gid), BytesIO(raw))
+        await _upload(
+            context,
+            element.resource,
+            "image",
+            client.upload_image,
+            "current cai can only send flash-image in group",
+        )
     ).to_flash()
 
 
 @resume(Audio)
 async def voice(context: Context, element: Audio):
     assert isinstance(context.account, CAIAccount)
-    raw = await context.fetch(element.resource)
-    scene = context.scene
-    if not (gid := scene.pattern.get("group")):
-        raise UnsupportedOperation("current cai can only send voice in group")
-    return await context.account.client.upload_voice(int(gid), BytesIO(raw))
+    client = context.account.client
+    return await _upload(
+        context,
+        element.resource,
+        "voice",
+        client.upload_voice,
+        "current cai can only send voice in group",
+    )
 
 
 @resume(Video)
 async def video(context: Context, element: Video):
     assert isinstance(context.account, CAIAccount)
-    raw = await context.fetch(element.resource)
-    scene = context.scene
-    if not (gid := scene.pattern.get("group")):
-        raise UnsupportedOperation("current cai can only send voice in group")
-    return await context.account.client.upload_video(
-        int(gid), BytesIO(raw), BytesIO(raw)
+    client = context.account.client
+    return await _upload(
+        context,
+        element.resource,
+        "video",
+        # cai needs a thumbnail for videos, the video itself is used as before
+        lambda gid, file: client.upload_video(gid, file, _FileView(file)),  # type: ignore
+        "current cai can only send voice in group",
     )
 
 
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sink = Callable[[str, str, str, float], None]
+GaugeSource = Callable[[], Dict[str, float]]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Latency histograms of the adapter, by stage, account and label.
+
+    The label is the event type for parse_event and post, the element type for
+    serialize, the upload kind for upload and the scene kind for send. Each
+    observation is also passed to the registered sinks, and accounts provide
+    gauges of their queues and caches. ``serve`` exposes everything in the
+    Prometheus text format.
+    """
+
+    enabled: bool
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS, enabled: bool = True):
+        self.buckets = buckets
+        self.enabled = enabled
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._sinks: List[Sink] = []
+        self._gauges: Dict[str, GaugeSource] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def observe(self, stage: str, account: str, label: str, seconds: float):
+        if not self.enabled:
+            return
+        key = (stage, account, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        for sink in self._sinks:
+            try:
+                sink(stage, account, label, seconds)
+            except Exception as e:
+                logger.debug(f"metrics sink {sink!r} failed: {e!r}")
+
+    def add_sink(self, sink: Sink):
+        """``sink(stage, account, label, seconds)`` is called on every observation."""
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: Sink):
+        self._sinks.remove(sink)
+
+    def add_gauges(self, account: str, source: GaugeSource):
+        self._gauges[account] = source
+
+    def remove_gauges(self, account: str):
+        self._gauges.pop(account, None)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP avilla_cai_stage_seconds Time spent in each stage of the adapter.",
+            "# TYPE avilla_cai_stage_seconds histogram",
+        ]
+        for (stage, account, label), histogram in sorted(self.histograms.items()):
+            labels = f'stage="{_escape(stage)}",account="{_escape(account)}",label="{_escape(label)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'avilla_cai_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'avilla_cai_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"avilla_cai_stage_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"avilla_cai_stage_seconds_count{{{labels}}} {histogram.count}")
+        gauges: Dict[str, List[str]] = {}
+        for account, source in sorted(self._gauges.items()):
+            try:
+                values = source()
+            except Exception as e:
+                logger.debug(f"failed to collect gauges of {account}: {e!r}")
+                continue
+            for name, value in values.items():
+                gauges.setdefault(name, []).append(
+                    f'avilla_cai_{name}{{account="{_escape(account)}"}} {float(value)}'
+                )
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE avilla_cai_{name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9108) -> asyncio.AbstractServer:
+        """Serve ``render()`` over HTTP for Prometheus to scrape."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"serving cai metrics on http://{host}:{port}/metrics")
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # only the request head is read, any path gets the metrics
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+                pass
+            body = self.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
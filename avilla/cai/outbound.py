@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from cai.client.message_service.models import Element as CAIElement
+from cai.client.message_service.models import TextElement
+from graia.amnesia.message import __message_chain_class__
+from graia.amnesia.message.element import Text
+from loguru import logger
+
+Sender = Callable[[List[CAIElement]], Awaitable[Any]]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available, 0 if there is one now."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens -= 1
+
+    @property
+    def idle(self) -> bool:
+        return self.rate <= 0 or self.tokens >= self.burst
+
+
+class _Send:
+    __slots__ = ("scene", "elements", "send", "content", "future", "coalescable")
+
+    def __init__(
+        self, scene: Hashable, elements: List[CAIElement], send: Sender, content: Any, coalescable: bool
+    ):
+        self.scene = scene
+        self.elements = elements
+        self.send = send
+        self.content = content
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.coalescable = coalescable
+
+
+class OutboundScheduler:
+    """Outbound message queue of one account.
+
+    Sends are rate limited by a token bucket per scene and one for the whole
+    account, replies go through a priority lane, and consecutive plain-text
+    sends to the same scene may be merged into one message.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 5,
+        account_rate: float = 5.0,
+        account_burst: int = 10,
+        coalesce: bool = False,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.coalesce = coalesce
+        self.sent = 0
+        self.coalesced = 0
+        self._account = TokenBucket(account_rate, account_burst)
+        self._scenes: Dict[Hashable, TokenBucket] = {}
+        self._priority: Deque[_Send] = deque()
+        self._normal: Deque[_Send] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: List[_Send] = []
+
+    @property
+    def depth(self) -> int:
+        return len(self._priority) + len(self._normal)
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self.depth, "sent": self.sent, "coalesced": self.coalesced}
+
+    async def submit(
+        self,
+        scene: Hashable,
+        elements: List[CAIElement],
+        send: Sender,
+        *,
+        content: Any = None,
+        priority: bool = False,
+    ) -> Tuple[Any, Any]:
+        """Queue a send and wait for its result.
+
+        Returns the result with the ``content`` that was actually sent, which is
+        the merged chain when the send was coalesced with others.
+        """
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        assert self._wakeup is not None
+        # without the content the merged message could not be reported back
+        coalescable = (
+            self.coalesce
+            and not priority
+            and content is not None
+            and all(isinstance(e, TextElement) for e in elements)
+        )
+        item = _Send(scene, elements, send, content, coalescable)
+        lane = self._priority if priority else self._normal
+        lane.append(item)
+        self._wakeup.set()
+        try:
+            return await item.future
+        except asyncio.CancelledError:
+            # not picked yet, the caller gave up so it is never sent
+            if item in lane:
+                lane.remove(item)
+            raise
+
+    async def close(self, timeout: float | None = None):
+        """Send what is queued, then stop."""
+        if self._task is None:
+            return
+        pending = [item.future for item in (*self._sending, *self._priority, *self._normal)]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        for item in (*self._priority, *self._normal):
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("outbound queue closed"))
+        self._priority.clear()
+        self._normal.clear()
+        self._task = None
+
+    def _bucket(self, scene: Hashable) -> TokenBucket:
+        bucket = self._scenes.get(scene)
+        if bucket is None:
+            if len(self._scenes) >= 1024:
+                self._scenes = {key: value for key, value in self._scenes.items() if not value.idle}
+            bucket = self._scenes[scene] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[Tuple[Deque[_Send], _Send]], float]:
+        wait = self._account.wait(now)
+        if wait > 0:
+            return None, wait
+        soonest = float("inf")
+        blocked = set()
+        for lane in (self._priority, self._normal):
+            for item in lane:
+                # a scene waiting for tokens blocks its later sends, to keep their order
+                if item.scene in blocked:
+                    continue
+                wait = self._bucket(item.scene).wait(now)
+                if wait <= 0:
+                    return (lane, item), 0.0
+                blocked.add(item.scene)
+                soonest = min(soonest, wait)
+        return None, soonest
+
+    def _merge(self, lane: Deque[_Send], item: _Send) -> List[_Send]:
+        batch = [item]
+        if not item.coalescable:
+            return batch
+        for other in list(lane):
+            if other.scene != item.scene:
+                continue
+            if not other.coalescable:
+                break
+            batch.append(other)
+            lane.remove(other)
+        return batch
+
+    async def _run(self):
+        assert self._wakeup is not None
+        while True:
+            if not self.depth:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            picked, wait = self._pick(now)
+            if picked is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            lane, item = picked
+            lane.remove(item)
+            batch = self._merge(lane, item)
+            elements = list(item.elements)
+            for other in batch[1:]:
+                elements.append(TextElement("\n"))
+                elements.extend(other.elements)
+            self._account.take(now)
+            self._bucket(item.scene).take(now)
+            self._sending = batch
+            try:
+                result = await item.send(elements)
+            except BaseException as e:
+                logger.debug(f"failed to send to {item.scene}: {e!r}")
+                # a cancelled send must not leave its callers waiting
+                error = e if isinstance(e, Exception) else RuntimeError("outbound queue closed")
+                for sent in batch:
+                    if not sent.future.done():
+                        sent.future.set_exception(error)
+                if not isinstance(e, Exception):
+                    raise
+            else:
+                self.sent += 1
+                self.coalesced += len(batch) - 1
+                content = _joined(batch)
+                for sent in batch:
+                    if not sent.future.done():
+                        sent.future.set_result((result, content))
+            finally:
+                self._sending = []
+
+
+def _joined(batch: List[_Send]) -> Any:
+    if len(batch) == 1:
+        return batch[0].content
+    content: List[Any] = list(batch[0].content.content)
+    for sent in batch[1:]:
+        content.append(Text("\n"))
+        content.extend(sent.content.content)
+    return __message_chain_class__(content)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Awaitable, Callable, TypedDict
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, TypedDict
 
 from avilla.cai.account import CAIAccount
 from avilla.cai.client import CAIClient
@@ -8,6 +10,7 @@ from avilla.cai.config import CAIConfig
 from avilla.cai.service import CAIService
 from avilla.core.application import Avilla
 from avilla.core.context import Context
+from avilla.core.elements import Audio, Picture, Video
 from avilla.core.event import AvillaEvent
 from avilla.core.message import Message
 from avilla.core.platform import Abstract, Land, Platform
@@ -19,12 +22,19 @@ from cai.client.message_service.models import Element as CAIElement
 from cai.client.message_service.models import ReplyElement
 from graia.amnesia.message import __message_chain_class__
 from graia.amnesia.message.element import Element
-from graia.amnesia.builtins.memcache import MemcacheService, Memcache
+from graia.amnesia.builtins.memcache import MemcacheService
 from loguru import logger
 from typing_extensions import TypeAlias
 
+from .chain import LazyMessageChain
+from .exceptions import MessageSerializeError
+from .metrics import Metrics
 from .trait import ElementResumer, ElementResume
 
+# elements whose resumers fetch and upload, they are resumed concurrently
+MEDIA_ELEMENTS = (Picture, Audio, Video)
+
+
 class MessageDeserializeResult(TypedDict):
     content: list[Element]
     reply: str | None
@@ -74,77 +84,202 @@ class CAIProtocol(BaseProtocol):
 
     service: CAIService
 
-    def __init__(self, *config: CAIConfig):
+    def __init__(
+        self,
+        *config: CAIConfig,
+        shards: int = 0,
+        login_concurrency: int = 4,
+        login_stagger: float = 1.0,
+        client_factory: Callable[[CAIConfig], Any] | None = None,
+        metrics_port: int | None = None,
+    ):
         self.configs: list[CAIConfig] = list(set(config))
+        self.shards = shards
+        self.login_concurrency = login_concurrency
+        self.login_stagger = login_stagger
+        # builds the cai client of an account instead of a real one, e.g. ``avilla.cai.fake.FakeClient``
+        self.client_factory = client_factory
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
         super().__init__()
+        # the artifact registries stay the source of truth,
+        # these tables only skip building signatures on the hot path.
+        self._event_parser_table: dict[str, EventParser | None] = {
+            signature.event_type: parser
+            for signature, parser in self.event_parsers.items()
+            if isinstance(signature, EventParse)
+        }
+        self._element_parser_table: dict[str, ElementParser | None] = {
+            signature.element_type: parser
+            for signature, parser in self.message_parsers.items()
+            if isinstance(signature, ElementParse)
+        }
+        self._element_resumer_table: dict[type, ElementResumer | None] = {
+            signature.element_type: resumer
+            for signature, resumer in self.message_resumers.items()
+            if isinstance(signature, ElementResume)
+        }
+
+    def get_event_parser(self, event_type: str) -> EventParser | None:
+        try:
+            return self._event_parser_table[event_type]
+        except KeyError:
+            parser = self.event_parsers.get(EventParse(event_type))
+            self._event_parser_table[event_type] = parser
+            return parser
+
+    def get_element_parser(self, element_type: str) -> ElementParser | None:
+        try:
+            return self._element_parser_table[element_type]
+        except KeyError:
+            parser = self.message_parsers.get(ElementParse(element_type))
+            self._element_parser_table[element_type] = parser
+            return parser
+
+    def get_element_resumer(self, element_type: type) -> ElementResumer | None:
+        try:
+            return self._element_resumer_table[element_type]
+        except KeyError:
+            resumer = None
+            for cls in element_type.__mro__:
+                resumer = self.message_resumers.get(ElementResume(cls))
+                if resumer is not None:
+                    break
+            self._element_resumer_table[element_type] = resumer
+            return resumer
 
     def ensure(self, avilla: Avilla):
         self.avilla = avilla
-        self.service = CAIService(self)
+        self.service = CAIService(self, self.shards, self.login_concurrency, self.login_stagger)
         avilla.launch_manager.add_service(MemcacheService(1))
         avilla.launch_manager.add_service(self.service)
         for config in self.configs:
-            client = CAIClient(self, config)
-            self.service.clients.append(client)
+            client = self.create_client(config)
+            self.service.add_client(client)
             avilla.launch_manager.add_launchable(client)
 
+    def create_client(self, config: CAIConfig) -> CAIClient:
+        return CAIClient(self, config, self.client_factory(config) if self.client_factory else None)
+
     async def serialize_message(
         self,
         message: __message_chain_class__,
         context: Context,
         reply: Selector | None = None,
     ) -> list[CAIElement]:
+        metrics = self.metrics
+        account_id = context.account.id
+        started = time.perf_counter()
         result: list[CAIElement] = []
         if reply:
-            memcache = context.avilla.launch_manager.get_interface(Memcache)
-            origin: Message | None = memcache.get(f"_cai_context.message.{reply.pattern['message']}")
-            assert origin is not None
-            result.append(
-                ReplyElement(
-                    seq=int(origin.id),
-                    time=int(origin.time.timestamp()),
-                    sender=int(origin.sender.last_value),
-                    message=await self.serialize_message(origin.content, context, origin.reply),
+            assert isinstance(context.account, CAIAccount)
+            origin: Message | None = await context.account.connection.messages.get(reply)
+            if origin is None:
+                logger.warning(f"origin of {reply} is no longer stored, sending without reply")
+            else:
+                result.append(
+                    ReplyElement(
+                        seq=int(origin.id),
+                        time=int(origin.time.timestamp()),
+                        sender=int(origin.sender.last_value),
+                        message=await self.serialize_message(origin.content, context, origin.reply),
+                    )
                 )
-            )
+        resumers: list[ElementResumer] = []
         for element in message.content:
-            resumer: ElementResumer | None = self.message_resumers.get(
-                ElementResume(element.__class__)
-            )
+            resumer = self.get_element_resumer(element.__class__)
             if resumer is None:
                 raise NotImplementedError(
                     f'expected element "{element.__class__}" implemented for {element}'
                 )
-            result.append(await resumer(context, element))
+            resumers.append(resumer)
+        if not any(isinstance(element, MEDIA_ELEMENTS) for element in message.content):
+            for element, resumer in zip(message.content, resumers):
+                resume_started = time.perf_counter()
+                result.append(await resumer(context, element))
+                metrics.observe(
+                    "serialize", account_id, element.__class__.__name__, time.perf_counter() - resume_started
+                )
+            metrics.observe("serialize_message", account_id, "", time.perf_counter() - started)
+            return result
+
+        assert isinstance(context.account, CAIAccount)
+        limit = context.account.connection.upload_limit
+
+        async def _resume(element: Element, resumer: ElementResumer):
+            if isinstance(element, MEDIA_ELEMENTS):
+                async with limit:
+                    resume_started = time.perf_counter()
+                    resumed = await resumer(context, element)
+            else:
+                resume_started = time.perf_counter()
+                resumed = await resumer(context, element)
+            metrics.observe("serialize", account_id, element.__class__.__name__, time.perf_counter() - resume_started)
+            return resumed
+
+        outcomes = await asyncio.gather(
+            *(_resume(element, resumer) for element, resumer in zip(message.content, resumers)),
+            return_exceptions=True,
+        )
+        errors = [
+            (index, element, outcome)
+            for index, (element, outcome) in enumerate(zip(message.content, outcomes))
+            if isinstance(outcome, BaseException)
+        ]
+        if len(errors) == 1:
+            raise errors[0][2]
+        if errors:
+            raise MessageSerializeError(errors) from errors[0][2]
+        result.extend(outcomes)
+        metrics.observe("serialize_message", account_id, "", time.perf_counter() - started)
         return result
 
     async def deserialize_message(self, context: Context, message: list[CAIElement]):
+        started = time.perf_counter()
         serialized: list[Element] = []
         result: MessageDeserializeResult = {"content": serialized, "reply": None}
         for raw_element in message:
-            if not hasattr(raw_element, "type"):
-                raise KeyError(f'expected "type" exists for {raw_element}')
-            element_type = raw_element.type
             if isinstance(raw_element, ReplyElement):
                 result["reply"] = str(raw_element.seq)
                 continue
-            parser: ElementParser | None = self.message_parsers.get(
-                ElementParse(element_type)
-            )
+            try:
+                element_type = raw_element.type
+            except AttributeError:
+                raise KeyError(f'expected "type" exists for {raw_element}') from None
+            parser = self.get_element_parser(element_type)
             if parser is None:
                 raise NotImplementedError(
                     f'expected element "{element_type}" implemented for {raw_element}'
                 )
             serialized.append(await parser(context, raw_element))
+        self.metrics.observe("deserialize_message", context.account.id, "", time.perf_counter() - started)
         return result
 
+    async def deserialize_chain(
+        self, context: Context, message: list[CAIElement]
+    ) -> tuple[__message_chain_class__, str | None]:
+        """The message chain and the replied seq, lazily converted if the account enables ``lazy_message``."""
+        assert isinstance(context.account, CAIAccount)
+        if not context.account.connection.config.lazy_message:
+            result = await self.deserialize_message(context, message)
+            return __message_chain_class__(result["content"]), result["reply"]
+        reply = None
+        raw: list[CAIElement] = []
+        for element in message:
+            if isinstance(element, ReplyElement):
+                reply = str(element.seq)
+            else:
+                raw.append(element)
+        return LazyMessageChain.from_raw(self, context, raw), reply
+
     async def parse_event(
         self, account: CAIAccount, event: CAIEvent, *, error: bool = False
     ):
-        if not hasattr(event, "type"):
-            raise KeyError(f'expected "type" exists for {event}')
-        event_type = event.type
-        parser: EventParser | None = self.event_parsers.get(EventParse(event_type))
+        try:
+            event_type = event.type
+        except AttributeError:
+            raise KeyError(f'expected "type" exists for {event}') from None
+        parser = self.get_event_parser(event_type)
         if parser is None:
             if error:
                 raise NotImplementedError(
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import pickle
+import time
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Iterator, Optional, Tuple, Union
+
+from cai.client.events import Event as CAIEvent
+from loguru import logger
+
+if TYPE_CHECKING:
+    from .client import CAIClient
+
+REPLAY_HEADER = ("avilla-cai-replay", 1)
+
+
+class EventRecorder:
+    """Captures the raw events of a client into a file for ``replay``.
+
+    Register it as an event listener of a real ``cai.Client``, each event is
+    stored with its offset from the first one.
+    """
+
+    path: Path
+    count: int
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.count = 0
+        self._file: Optional[IO[bytes]] = None
+        self._started = 0.0
+
+    def attach(self, client: Any):
+        client.add_event_listener(self)
+
+    async def __call__(self, _: Any, event: CAIEvent):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("wb")
+            self._started = time.monotonic()
+            pickle.dump(REPLAY_HEADER, self._file)
+        try:
+            blob = pickle.dumps((time.monotonic() - self._started, event))
+        except Exception as e:
+            logger.debug(f"event {event!r} is not picklable, not recorded: {e!r}")
+            return
+        self._file.write(blob)
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_events(path: Union[str, Path]) -> Iterator[Tuple[float, CAIEvent]]:
+    with Path(path).open("rb") as file:
+        if pickle.load(file) != REPLAY_HEADER:
+            raise ValueError(f"{path} is not an event recording")
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+async def replay(connection: CAIClient, path: Union[str, Path], speed: float = 1.0) -> int:
+    """Feed recorded events to ``connection`` through its event hook.
+
+    Events keep their recorded spacing divided by ``speed``, a ``speed`` of 0
+    sends them as fast as the dispatcher accepts. Returns the number replayed.
+    """
+    started = time.monotonic()
+    count = 0
+    for offset, event in load_events(path):
+        if speed > 0:
+            delay = offset / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await connection._cai_event_hook(connection.client, event)
+        count += 1
+    return count
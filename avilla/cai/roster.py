@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict
+
+from cai.client.events import Event as CAIEvent
+from cai.client.events.group import (
+    GroupMemberJoinedEvent,
+    GroupMemberLeaveEvent,
+    GroupMemberMutedEvent,
+    GroupMemberPermissionChangeEvent,
+    GroupMemberSpecialTitleChangedEvent,
+    GroupMemberUnMutedEvent,
+    TransferGroupEvent,
+)
+from cai.client.models import GroupMember
+
+from .cache import SingleFlight
+
+if TYPE_CHECKING:
+    from .coalesce import CoalescedAPI
+
+# 这些事件会改变群成员列表或成员信息, 收到后丢弃对应群的缓存
+INVALIDATING_EVENTS = (
+    GroupMemberJoinedEvent,
+    GroupMemberLeaveEvent,
+    GroupMemberMutedEvent,
+    GroupMemberUnMutedEvent,
+    GroupMemberPermissionChangeEvent,
+    GroupMemberSpecialTitleChangedEvent,
+    TransferGroupEvent,
+)
+
+
+class MemberRoster:
+    """Per-group member list cache of one account, indexed by uin."""
+
+    api: CoalescedAPI
+    ttl: float
+
+    def __init__(self, api: CoalescedAPI, ttl: float = 60.0):
+        self.api = api
+        self.ttl = ttl
+        self._members: SingleFlight[int, Dict[int, GroupMember]] = SingleFlight(ttl)
+
+    async def fetch(self, group_id: int) -> Dict[int, GroupMember]:
+        return await self._members.get(group_id, lambda: self._load(group_id))
+
+    async def get(self, group_id: int, uin: int) -> GroupMember:
+        try:
+            return (await self.fetch(group_id))[uin]
+        except KeyError as e:
+            raise RuntimeError(f"member {uin} not found in group {group_id}") from e
+
+    def invalidate(self, group_id: int | None = None):
+        if group_id is None:
+            self._members.clear()
+        else:
+            self._members.invalidate(group_id)
+
+    def feed(self, event: CAIEvent):
+        if isinstance(event, INVALIDATING_EVENTS):
+            self.invalidate(event.group_id)
+
+    async def _load(self, group_id: int) -> Dict[int, GroupMember]:
+        result: list[GroupMember] | None = await self.api.get_group_member_list(group_id)
+        return {member.uin: member for member in result or ()}
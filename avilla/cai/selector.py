@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from avilla.core.context import Context
+from avilla.core.selector import Selector
+
+from .cache import LRUCache
+
+if TYPE_CHECKING:
+    from .account import CAIAccount
+
+
+class SelectorPool:
+    """Interned selectors of one account, shared between events.
+
+    Selectors are copy-on-write, chaining on a pooled one gives a new selector
+    and never changes it, so the instances here are safe to hand out. Callers
+    must not modify ``pattern`` in place.
+    """
+
+    __slots__ = ("land", "account_id", "root", "account", "_groups", "_selfs", "_members", "_friends")
+
+    def __init__(self, land: str, account_id: str, account: Selector, maxsize: int = 8192):
+        self.land = land
+        self.account_id = account_id
+        self.root = Selector().land(land)
+        self.account = account
+        self._groups: LRUCache[str, Selector] = LRUCache(maxsize)
+        self._selfs: LRUCache[str, Selector] = LRUCache(maxsize)
+        self._members: LRUCache[Tuple[str, str], Selector] = LRUCache(maxsize)
+        self._friends: LRUCache[str, Selector] = LRUCache(maxsize)
+
+    def group(self, group_id: str) -> Selector:
+        selector = self._groups.get(group_id)
+        if selector is None:
+            selector = self.root.group(group_id)
+            self._groups.set(group_id, selector)
+        return selector
+
+    def self_in(self, group_id: str) -> Selector:
+        selector = self._selfs.get(group_id)
+        if selector is None:
+            selector = self.group(group_id).member(self.account_id)
+            self._selfs.set(group_id, selector)
+        return selector
+
+    def member(self, group_id: str, uin: str) -> Selector:
+        if uin == self.account_id:
+            return self.self_in(group_id)
+        key = (group_id, uin)
+        selector = self._members.get(key)
+        if selector is None:
+            selector = self.group(group_id).member(uin)
+            self._members.set(key, selector)
+        return selector
+
+    def friend(self, uin: str) -> Selector:
+        selector = self._friends.get(uin)
+        if selector is None:
+            selector = self.root.friend(uin)
+            self._friends.set(uin, selector)
+        return selector
+
+
+def group_context(
+    account: CAIAccount,
+    group_id: str,
+    client: Selector,
+    endpoint: Optional[Selector] = None,
+    mediums: Optional[List[Selector]] = None,
+) -> Context:
+    """Context of an event in a group, ``endpoint`` defaults to the group."""
+    pool = account.connection.selectors
+    group = pool.group(group_id)
+    selft = pool.self_in(group_id)
+    return Context(account, client, endpoint or group, group, selft, mediums or [])
+
+
+def friend_context(account: CAIAccount, uin: str, mediums: Optional[List[Selector]] = None) -> Context:
+    pool = account.connection.selectors
+    friend = pool.friend(uin)
+    return Context(account, friend, pool.account, friend, pool.account, mediums or [])
+
+
+def scene_context(account: CAIAccount, scene: Selector, sender: Selector) -> Context:
+    """Context of a message received in ``scene``, as built by the message event parsers."""
+    pattern = scene.pattern
+    if "friend" in pattern:
+        return friend_context(account, pattern["friend"])
+    if "member" in pattern:
+        # 临时会话
+        return Context(account, scene, scene, scene, account.connection.selectors.self_in(pattern["group"]), [])
+    return group_context(account, pattern["group"], sender)
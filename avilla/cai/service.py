@@ -1,11 +1,14 @@
 from __future__ import annotations
 import asyncio
-from typing import TYPE_CHECKING, Set, Literal, List
+from contextlib import suppress
+from typing import TYPE_CHECKING, Dict, Optional, Set, Literal
 from launart import Launart, Service
 from graia.amnesia.transport.common.client import AbstractClientInterface
 from graia.amnesia.builtins.memcache import MemcacheService
 from avilla.cai.client import CAIClient
 from avilla.cai.config import CAIConfig
+from avilla.cai.shard import ShardManager
+from avilla.cai.utils import LoginScheduler
 
 if TYPE_CHECKING:
     from .protocol import CAIProtocol
@@ -16,28 +19,85 @@ class CAIService(Service):
     supported_interface_types = set()
 
     protocol: CAIProtocol
-    clients: List[CAIClient]
+    clients: Dict[str, CAIClient]
+    shards: Optional[ShardManager]
+    logins: LoginScheduler
 
     @classmethod
-    def loads(cls, *config: CAIConfig):
+    def loads(cls, *config: CAIConfig, shards: int = 0, login_concurrency: int = 4, login_stagger: float = 1.0):
         from .protocol import CAIProtocol
-        return cls(CAIProtocol(*config))
+        return cls(
+            CAIProtocol(*config, shards=shards, login_concurrency=login_concurrency, login_stagger=login_stagger),
+            shards,
+            login_concurrency,
+            login_stagger,
+        )
 
-    def __init__(self, protocol: CAIProtocol):
+    def __init__(
+        self,
+        protocol: CAIProtocol,
+        shards: int = 0,
+        login_concurrency: int = 4,
+        login_stagger: float = 1.0,
+    ):
         self.protocol = protocol
-        self.clients = []
+        self.clients = {}
+        self.shards = ShardManager(shards) if shards > 0 else None
+        self.logins = LoginScheduler(login_concurrency, login_stagger)
+        self._hot: Set[str] = set()
+        self._running = False
         super().__init__()
 
+    def add_client(self, client: CAIClient):
+        self.clients[str(client.config.account)] = client
+
+    def remove_client(self, account_id: str) -> CAIClient:
+        try:
+            return self.clients.pop(account_id)
+        except KeyError:
+            raise ValueError(f"Account {account_id} not found") from None
+
     def had_client(self, account_id: str):
-        return any(
-            account_id == str(client.config.account) for client in self.clients
-        )
+        return account_id in self.clients
 
     def get_client(self, account_id: str):
-        for client in self.clients:
-            if str(client.config.account) == account_id:
-                return client
-        raise ValueError(f"Account {account_id} not found")
+        try:
+            return self.clients[account_id]
+        except KeyError:
+            raise ValueError(f"Account {account_id} not found") from None
+
+    async def add_account(self, config: CAIConfig) -> CAIClient:
+        """Add an account while running, without restarting the launch manager."""
+        account_id = str(config.account)
+        if account_id in self.clients:
+            raise ValueError(f"Account {account_id} already exists")
+        if not self._running:
+            raise RuntimeError("accounts can only be added at runtime when the service is blocking")
+        client = self.protocol.create_client(config)
+        self.add_client(client)
+        self._hot.add(account_id)
+        config.init_dir()
+        try:
+            await client.start()
+        except Exception:
+            self.remove_client(account_id)
+            self._hot.discard(account_id)
+            if self.shards:
+                # the shard already holds a cai client for it
+                self.shards.detach(account_id)
+            raise
+        self.protocol.configs.append(config)
+        return client
+
+    async def remove_account(self, account_id: str):
+        """Remove an account while running; its queued events are handled first."""
+        client = self.remove_client(account_id)
+        self._hot.discard(account_id)
+        with suppress(ValueError):
+            self.protocol.configs.remove(client.config)
+        await client.stop()
+        if self.shards:
+            self.shards.detach(account_id)
 
     def get_interface(self, interface_type):
         return None
@@ -52,11 +112,18 @@ class CAIService(Service):
 
     async def launch(self, manager: Launart):
         async with self.stage("preparing"):
-            for client in self.clients:
+            for client in self.clients.values():
                 client.config.init_dir()
+            if self.shards:
+                self.shards.start()
+            if self.protocol.metrics_port:
+                await self.protocol.metrics.serve(port=self.protocol.metrics_port)
 
         async with self.stage("blocking"):
-            if self.clients:
+            self._running = True
+            # accounts added at runtime are not launched by the manager, so only wait for the others
+            launched = [client for client in self.clients.values() if str(client.config.account) not in self._hot]
+            if launched:
                 await asyncio.wait(
                     [
                         client.status.wait_for(
@@ -64,9 +131,17 @@ class CAIService(Service):
                             "cleanup",  # type: ignore
                             "finished",  # type: ignore
                         )
-                        for client in self.clients
+                        for client in launched
                     ]
                 )
+            else:
+                await manager.status.wait_for_sigexit()
 
         async with self.stage("cleanup"):
-            ...  # TODO
+            self._running = False
+            hot = [self.clients[account_id] for account_id in self._hot if account_id in self.clients]
+            if hot:
+                await asyncio.gather(*(client.stop() for client in hot), return_exceptions=True)
+            if self.shards:
+                await self.shards.close()
+            await self.protocol.metrics.close()
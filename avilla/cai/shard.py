@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import multiprocessing
+import pickle
+import threading
+from contextlib import suppress
+from io import BytesIO
+from multiprocessing.connection import Connection
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from cai import Client
+from cai.client.events import Event as CAIEvent
+from loguru import logger
+
+from .config import CAIConfig
+
+# the siginfo changes after these calls, so the worker pushes it back
+SIG_METHODS = {"login", "token_login", "submit_captcha", "submit_slider_ticket", "submit_sms", "session.close"}
+
+EventListener = Callable[[Any, CAIEvent], Awaitable[None]]
+
+
+def _dumps_error(error: BaseException) -> bytes:
+    # exceptions with a custom __init__ may pickle but fail to unpickle
+    try:
+        blob = pickle.dumps(error)
+        pickle.loads(blob)
+        return blob
+    except Exception:
+        return pickle.dumps(RuntimeError(repr(error)))
+
+
+def _portable(value: Any) -> Any:
+    # temp files and other streams do not pickle, send their content instead
+    if hasattr(value, "read") and not isinstance(value, BytesIO):
+        return BytesIO(value.read())
+    return value
+
+
+def _pump(conn: Connection, deliver: Callable[[tuple], None]):
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            deliver(("closed",))
+            return
+        deliver(message)
+        if message[0] == "close":
+            return
+
+
+# ---- worker process ----
+
+
+class _Worker:
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.clients: Dict[int, Client] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    def send(self, message: tuple):
+        try:
+            self.conn.send(message)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning(f"failed to forward {message[0]} to the coordinator: {e!r}")
+
+    def attach(self, config: CAIConfig):
+        config.init_dir()
+        uin = int(config.account)
+        client = Client(uin, config.password, config.protocol)
+
+        async def forward(_: Client, event: CAIEvent):
+            self.send(("event", uin, client.connected, event))
+
+        client.add_event_listener(forward)
+        self.clients[uin] = client
+
+    async def detach(self, uin: int):
+        client = self.clients.pop(uin, None)
+        if client is not None and client.connected:
+            with suppress(Exception):
+                await client.session.close()
+
+    async def call(self, call_id: int, uin: int, method: str, args: tuple, kwargs: dict):
+        client = self.clients.get(uin)
+        try:
+            if client is None:
+                raise RuntimeError(f"account {uin} is not attached to this shard")
+            target: Any = client
+            for name in method.split("."):
+                target = getattr(target, name)
+            result = (True, pickle.dumps(await target(*args, **kwargs)))
+        except Exception as e:
+            result = (False, _dumps_error(e))
+        # the state goes first, so the caller sees it once its call returns
+        if client is not None and method in SIG_METHODS:
+            sig = None
+            with suppress(Exception):
+                sig = client.dump_sig()
+            self.send(("state", uin, client.connected, sig))
+        self.send(("result", call_id, *result))
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[tuple] = asyncio.Queue()
+        threading.Thread(
+            target=_pump,
+            args=(self.conn, lambda message: loop.call_soon_threadsafe(queue.put_nowait, message)),
+            daemon=True,
+        ).start()
+        while True:
+            message = await queue.get()
+            kind = message[0]
+            if kind == "call":
+                task = asyncio.create_task(self.call(*message[1:]))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            elif kind == "attach":
+                self.attach(message[1])
+            elif kind == "detach":
+                await self.detach(message[1])
+            elif kind in {"close", "closed"}:
+                break
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*(self.detach(uin) for uin in list(self.clients)), return_exceptions=True)
+
+
+def worker_main(conn: Connection, configs: List[CAIConfig]):
+    worker = _Worker(conn)
+    for config in configs:
+        worker.attach(config)
+    asyncio.run(worker.serve())
+
+
+# ---- coordinator ----
+
+
+class RemoteClient:
+    """Stands in for ``cai.Client`` of an account that lives in a shard process.
+
+    Coroutine methods, including nested ones like ``session.close``, are
+    forwarded to the shard; events of the account are delivered to the
+    listeners registered here.
+    """
+
+    def __init__(self, manager: ShardManager, uin: int, path: str = ""):
+        self._manager = manager
+        self._uin = uin
+        self._path = path
+
+    @property
+    def uin(self) -> int:
+        return self._uin
+
+    @property
+    def connected(self) -> bool:
+        return self._manager._connected.get(self._uin, False)
+
+    def dump_sig(self) -> bytes:
+        sig = self._manager._sigs.get(self._uin)
+        if sig is None:
+            raise RuntimeError(f"no siginfo of account {self._uin} received from its shard")
+        return sig
+
+    def add_event_listener(self, listener: EventListener):
+        self._manager._listeners.setdefault(self._uin, []).append(listener)
+
+    def __getattr__(self, name: str) -> RemoteClient:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return RemoteClient(self._manager, self._uin, f"{self._path}.{name}" if self._path else name)
+
+    async def __call__(self, *args, **kwargs):
+        if not self._path:
+            raise TypeError("RemoteClient is not callable")
+        return await self._manager.call(
+            self._uin, self._path, tuple(_portable(arg) for arg in args), {k: _portable(v) for k, v in kwargs.items()}
+        )
+
+
+class _Shard:
+    def __init__(self, index: int):
+        self.index = index
+        self.conn: Optional[Connection] = None
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.accounts: Set[int] = set()
+
+
+class ShardManager:
+    """Spreads the CAI clients of a service over worker processes.
+
+    Each shard runs its own event loop with the real clients. Raw CAI events
+    are forwarded to this process, where they are parsed and posted as usual,
+    and API calls made on a ``RemoteClient`` are routed back to the shard
+    owning the account.
+    """
+
+    count: int
+
+    def __init__(self, count: int):
+        self.count = max(1, count)
+        self._context = multiprocessing.get_context("spawn")
+        self._shards = [_Shard(index) for index in range(self.count)]
+        self._configs: Dict[int, CAIConfig] = {}
+        self._owner: Dict[int, _Shard] = {}
+        self._listeners: Dict[int, List[EventListener]] = {}
+        self._connected: Dict[int, bool] = {}
+        self._sigs: Dict[int, bytes] = {}
+        self._pending: Dict[int, Tuple[asyncio.Future, _Shard]] = {}
+        self._ids = itertools.count()
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def client_for(self, config: CAIConfig) -> RemoteClient:
+        uin = int(config.account)
+        self._configs[uin] = config
+        if self.running:
+            self._assign(uin, min(self._shards, key=lambda shard: len(shard.accounts)))
+            self._notify(self._owner[uin], ("attach", config))
+        return RemoteClient(self, uin)
+
+    def detach(self, account_id: str):
+        uin = int(account_id)
+        self._configs.pop(uin, None)
+        self._listeners.pop(uin, None)
+        shard = self._owner.pop(uin, None)
+        if shard is not None:
+            shard.accounts.discard(uin)
+            self._notify(shard, ("detach", uin))
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        for index, uin in enumerate(sorted(self._configs)):
+            self._assign(uin, self._shards[index % self.count])
+        for shard in self._shards:
+            conn, child = self._context.Pipe()
+            shard.conn = conn
+            shard.process = self._context.Process(
+                target=worker_main,
+                args=(child, [self._configs[uin] for uin in shard.accounts]),
+                name=f"cai-shard-{shard.index}",
+                daemon=True,
+            )
+            shard.process.start()
+            child.close()
+            threading.Thread(
+                target=_pump,
+                args=(conn, lambda message, shard=shard: self._deliver(shard, message)),
+                daemon=True,
+            ).start()
+            logger.info(f"cai shard #{shard.index} started with accounts {sorted(shard.accounts)}")
+
+    async def close(self, timeout: float = 10.0):
+        if not self.running:
+            return
+        for shard in self._shards:
+            self._notify(shard, ("close",))
+        loop = asyncio.get_running_loop()
+        for shard in self._shards:
+            if shard.process is None:
+                continue
+            await loop.run_in_executor(None, shard.process.join, timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+        self._loop = None
+
+    async def call(self, uin: int, method: str, args: tuple, kwargs: dict) -> Any:
+        if not self.running:
+            raise RuntimeError("shards are not running")
+        shard = self._owner[uin]
+        call_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = (future, shard)
+        try:
+            self._send(shard, ("call", call_id, uin, method, args, kwargs))
+        except BaseException:
+            del self._pending[call_id]
+            raise
+        return await future
+
+    def _assign(self, uin: int, shard: _Shard):
+        shard.accounts.add(uin)
+        self._owner[uin] = shard
+
+    def _send(self, shard: _Shard, message: tuple):
+        if shard.conn is None:
+            raise ConnectionError(f"cai shard #{shard.index} is not started")
+        try:
+            shard.conn.send(message)
+        except OSError as e:
+            raise ConnectionError(f"cai shard #{shard.index} is unreachable") from e
+
+    def _notify(self, shard: _Shard, message: tuple):
+        try:
+            self._send(shard, message)
+        except ConnectionError as e:
+            logger.error(f"failed to send {message[0]} to cai shard #{shard.index}: {e!r}")
+
+    def _deliver(self, shard: _Shard, message: tuple):
+        # called from the pump thread, workers exiting on close() may race with it
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._on_message, shard, message)
+        except RuntimeError:
+            # closed in the meantime
+            pass
+
+    def _on_message(self, shard: _Shard, message: tuple):
+        kind = message[0]
+        if kind == "event":
+            _, uin, connected, event = message
+            self._connected[uin] = connected
+            client = RemoteClient(self, uin)
+            for listener in self._listeners.get(uin, ()):
+                task = asyncio.create_task(listener(client, event))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        elif kind == "result":
+            _, call_id, ok, blob = message
+            future, _ = self._pending.pop(call_id, (None, None))
+            if future is None or future.done():
+                return
+            try:
+                value = pickle.loads(blob)
+            except Exception as e:
+                future.set_exception(RuntimeError(f"failed to load the result from shard: {e!r}"))
+                return
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        elif kind == "state":
+            _, uin, connected, sig = message
+            self._connected[uin] = connected
+            if sig is not None:
+                self._sigs[uin] = sig
+        elif kind == "closed":
+            for call_id, (future, owner) in list(self._pending.items()):
+                if owner is shard:
+                    del self._pending[call_id]
+                    if not future.done():
+                        future.set_exception(ConnectionError(f"cai shard #{shard.index} exited"))
+            for uin in shard.accounts:
+                self._connected[uin] = False
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from avilla.core.message import Message
+from avilla.core.selector import Selector
+from loguru import logger
+
+from .chain import LazyMessageChain
+
+_NON_SCENE_KEYS = {"land", "message", "random", "time"}
+
+
+def scene_key(selector: Selector) -> str:
+    return ".".join(f"{k}({v})" for k, v in selector.pattern.items() if k not in _NON_SCENE_KEYS)
+
+
+def _sizeof(message: Message) -> int:
+    # a rough estimate, exact sizes would need a pickle per message
+    if isinstance(message.content, LazyMessageChain):
+        return 256 + message.content.size_hint()
+    return 256 + len(str(message.content))
+
+
+class MessageStore:
+    """Messages of one account by (scene, seq), for resolving reply origins.
+
+    The in-memory part is an LRU bounded by count and estimated bytes. When a
+    ``path`` is given, evicted messages are spilled to a sqlite database and
+    kept there for ``spill_ttl`` seconds. Lazy message chains are spilled
+    unconverted, ``bind`` is called on messages loaded back to reattach them.
+    """
+
+    maxsize: int
+    max_bytes: int
+    path: Optional[Path]
+    spill_ttl: float
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        max_bytes: int = 16 * 1024 * 1024,
+        path: Optional[Path] = None,
+        spill_ttl: float = 6 * 3600,
+        bind: Optional[Callable[[Message], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.path = path
+        self.spill_ttl = spill_ttl
+        self.bind = bind
+        self.bytes = 0
+        self._data: OrderedDict[Tuple[str, str], Tuple[Message, int]] = OrderedDict()
+        self._executor: ThreadPoolExecutor | None = None
+        self._db: sqlite3.Connection | None = None
+        self._writes = 0
+
+    def set(self, message: Message):
+        key = (scene_key(message.scene), message.id)
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[1]
+        size = _sizeof(message)
+        self._data[key] = (message, size)
+        self.bytes += size
+        while self._data and (len(self._data) > self.maxsize or self.bytes > self.max_bytes):
+            evicted_key, (evicted, evicted_size) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+            self._spill(evicted_key, evicted)
+
+    async def get(self, selector: Selector) -> Message | None:
+        """Look up by a message selector, such as ``group(...).message(...)``."""
+        key = (scene_key(selector), selector.pattern["message"])
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key][0]
+        if self.path is None:
+            return
+        blob = await asyncio.get_running_loop().run_in_executor(self._get_executor(), self._read, key)
+        if blob is None:
+            return
+        try:
+            message: Message = pickle.loads(blob)
+        except Exception as e:
+            logger.debug(f"failed to load message {key}: {e!r}")
+            return
+        if self.bind is not None:
+            self.bind(message)
+        self.set(message)
+        return message
+
+    async def close(self):
+        # keep what is still in memory, replies should survive a restart as well
+        for key, (message, _) in self._data.items():
+            self._spill(key, message)
+        self._data.clear()
+        self.bytes = 0
+        if self._executor is None:
+            return
+        executor = self._get_executor()
+        await asyncio.get_running_loop().run_in_executor(executor, self._close_db)
+        executor.shutdown(wait=False)
+        self._executor = None
+
+    def _spill(self, key: Tuple[str, str], message: Message):
+        if self.path is None:
+            return
+        try:
+            blob = pickle.dumps(message)
+        except Exception as e:
+            logger.debug(f"message {key} is not picklable, dropped: {e!r}")
+            return
+        self._get_executor().submit(self._write, key, blob)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # a single thread owns the sqlite connection
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="cai-message-store")
+        return self._executor
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            assert self.path is not None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "scene TEXT NOT NULL, seq TEXT NOT NULL, time REAL NOT NULL, data BLOB NOT NULL, "
+                "PRIMARY KEY (scene, seq))"
+            )
+        return self._db
+
+    def _write(self, key: Tuple[str, str], blob: bytes):
+        try:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO messages (scene, seq, time, data) VALUES (?, ?, ?, ?)",
+                (*key, time.time(), blob),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                db.execute("DELETE FROM messages WHERE time < ?", (time.time() - self.spill_ttl,))
+        except sqlite3.Error as e:
+            logger.warning(f"failed to spill message {key}: {e!r}")
+
+    def _read(self, key: Tuple[str, str]) -> bytes | None:
+        try:
+            row = self._connect().execute(
+                "SELECT data FROM messages WHERE scene = ? AND seq = ? AND time >= ?",
+                (*key, time.time() - self.spill_ttl),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"failed to read message {key}: {e!r}")
+            return
+        return row[0] if row else None
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import pickle
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from avilla.core.resource import Resource
+from loguru import logger
+
+from .cache import LRUCache
+from .resource import CAIResource
+from .utils import atomic_write
+
+
+class UploadCache:
+    """Elements returned by uploads, keyed by content md5, target group and kind.
+
+    Resources received from CAI never change, so their md5 is remembered by
+    resource id as well, and a repeated send of them needs neither a fetch
+    nor an upload.
+    """
+
+    path: Optional[Path]
+
+    def __init__(self, maxsize: int = 512, path: Optional[Path] = None):
+        self.path = path
+        self._elements: LRUCache[Tuple[bytes, int, str], Any] = LRUCache(maxsize)
+        self._digests: LRUCache[Tuple[str, str], bytes] = LRUCache(maxsize)
+
+    def digest_of(self, resource: Resource) -> bytes | None:
+        if isinstance(resource, CAIResource):
+            return self._digests.get((resource.type, resource.id))
+
+    def remember(self, resource: Resource, digest: bytes):
+        if isinstance(resource, CAIResource):
+            self._digests.set((resource.type, resource.id), digest)
+
+    def get(self, digest: bytes, group_id: int, kind: str) -> Any | None:
+        return self._elements.get((digest, group_id, kind))
+
+    def set(self, digest: bytes, group_id: int, kind: str, element: Any):
+        self._elements.set((digest, group_id, kind), element)
+
+    async def load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(None, self.path.read_bytes)
+            elements, digests = pickle.loads(data)
+        except Exception as e:
+            logger.warning(f"failed to load upload cache from {self.path}: {e!r}")
+            return
+        for key, element in elements:
+            self._elements.set(key, element)
+        for key, digest in digests:
+            self._digests.set(key, digest)
+
+    async def save(self):
+        if self.path is None:
+            return
+        data = pickle.dumps((self._elements.items(), self._digests.items()))
+        await asyncio.get_running_loop().run_in_executor(None, atomic_write, self.path, data)
@@ -1,5 +1,12 @@
 import asyncio
-from typing import Iterable, Union, Coroutine, Optional
+import hashlib
+import os
+import random
+import tempfile
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Union, Coroutine, Optional
 from io import BytesIO
 from cai import Client, LoginSliderNeeded, LoginCaptchaNeeded, LoginDeviceLocked
 from loguru import logger
@@ -21,6 +28,55 @@ async def wait_fut(
         await asyncio.wait(tasks, timeout=timeout, return_when=return_when)
 
 
+async def _input() -> str:
+    # input() blocks, keep it off the event loop so other accounts can go on
+    return await asyncio.get_running_loop().run_in_executor(None, input)
+
+
+class LoginScheduler:
+    """Runs logins of many accounts with a concurrency cap and jittered staggering.
+
+    Interactive verification happens outside the cap and one account at a
+    time, so an account waiting for a ticket or sms code never holds up the
+    others.
+    """
+
+    concurrency: int
+    stagger: float
+
+    def __init__(self, concurrency: int = 4, stagger: float = 1.0):
+        self.concurrency = max(1, concurrency)
+        self.stagger = stagger
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._interactive: Optional[asyncio.Lock] = None
+        self._next_at = 0.0
+
+    async def run(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        resolve: Callable[[Exception], Awaitable[Any]],
+    ):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._interactive = asyncio.Lock()
+        async with self._slots:
+            await self._wait_turn()
+            try:
+                return await attempt()
+            except Exception as e:
+                error = e
+        assert self._interactive is not None
+        async with self._interactive:
+            return await resolve(error)
+
+    async def _wait_turn(self):
+        now = time.monotonic()
+        start = max(now, self._next_at)
+        self._next_at = start + self.stagger * random.uniform(0.5, 1.5)
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
 async def _login_slider_need(client: Client, exc: LoginSliderNeeded):
     verify = (
         f"1. '{exc.verify_url}'\n"
@@ -30,7 +86,7 @@ async def _login_slider_need(client: Client, exc: LoginSliderNeeded):
         f"<magenta>\nVerify url: </>\n<yellow>{verify}</>\nPlease enter the ticket:",
         alt=f"[magenta]\nVerify url: [/]\n[dark_orange]{verify}[/]\nPlease enter the ticket:",
     )
-    ticket = input().strip()
+    ticket = (await _input()).strip()
     try:
         await client.submit_slider_ticket(ticket)
         logger.success("Login Success!")
@@ -49,7 +105,7 @@ async def _login_captcha_needed(client: Client, exp: LoginCaptchaNeeded):
     image = Image.open(BytesIO(exp.captcha_image))
     image.show()
     logger.info("\nPlease enter the captcha: ")
-    captcha = input().strip()
+    captcha = (await _input()).strip()
     try:
         await client.submit_captcha(captcha, exp.captcha_sign)
         logger.success("Login Success!")
@@ -82,7 +138,7 @@ async def _login_device_locked(client: Client, exc: LoginDeviceLocked):
                 f"[yellow]Choose: [/]"
             ),
         )
-        choice = input()
+        choice = await _input()
         if "1" in choice and exc.sms_phone:
             way = "sms"
             break
@@ -94,7 +150,7 @@ async def _login_device_locked(client: Client, exc: LoginDeviceLocked):
     if way == "sms":
         await client.request_sms()
         logger.info(f"\nSMS was sent to {exc.sms_phone}!\nPlease enter the sms_code: ")
-        sms_code = input().strip()
+        sms_code = (await _input()).strip()
         try:
             await client.submit_sms(sms_code)
         except Exception as e:
@@ -104,7 +160,7 @@ async def _login_device_locked(client: Client, exc: LoginDeviceLocked):
             f"\nGo to \n{exc.verify_url} \nto verify device!\n"
             f"Press ENTER after verification to continue login..."
         )
-        input()
+        await _input()
         try:
             return await client.login()
         except Exception as e:
@@ -120,4 +176,39 @@ async def login_resolver(client: Client, exception: Exception):
         return await _login_device_locked(client, exception)
     else:
         # LoginAccountFrozen, LoginException, ApiResponseError, etc...
+        raise exception
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Write to a sibling temp file and rename it over path, never leaving a torn file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp)
         raise
+
+
+SIGINFO_MAGIC = b"AVILLA-CAI-SIG/1\n"
+
+
+def pack_siginfo(data: bytes) -> bytes:
+    return SIGINFO_MAGIC + hashlib.sha256(data).digest() + data
+
+
+def unpack_siginfo(blob: bytes) -> Optional[bytes]:
+    """Payload of a siginfo file, or None if it is empty or corrupt."""
+    if not blob.startswith(SIGINFO_MAGIC):
+        # written by earlier versions, which stored the raw siginfo
+        return blob or None
+    body = blob[len(SIGINFO_MAGIC):]
+    digest, data = body[:32], body[32:]
+    if not data or hashlib.sha256(data).digest() != digest:
+        return None
+    return data
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Iterator, List
+
+from cai.client.message_service.models import AtElement, FaceElement, TextElement
+
+GROUPS = range(100000, 100008)
+MEMBERS = range(200000, 200200)
+
+
+def _chain(rng: random.Random) -> List[Any]:
+    # mostly text, sometimes with an at, a face or an image
+    chain: List[Any] = [TextElement(f"message {rng.randrange(1 << 20)} " * rng.randint(1, 8))]
+    roll = rng.random()
+    if roll < 0.2:
+        chain.insert(0, AtElement(target=rng.choice(MEMBERS), display="@someone"))
+    elif roll < 0.3:
+        chain.append(FaceElement(rng.randrange(200)))
+    elif roll < 0.4:
+        chain.append(
+            SimpleNamespace(type="image", filename=f"{rng.randrange(1 << 32):x}.png", url="", is_emoji=False)
+        )
+    return chain
+
+
+def group_message(rng: random.Random, seq: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        type="group_message",
+        group_id=rng.choice(GROUPS),
+        from_uin=rng.choice(MEMBERS),
+        seq=seq,
+        time=int(time.time()),
+        message=_chain(rng),
+    )
+
+
+def private_message(rng: random.Random, seq: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        type="private_message",
+        from_uin=rng.choice(MEMBERS),
+        seq=seq,
+        time=int(time.time()),
+        message=_chain(rng),
+    )
+
+
+def group_nudge(rng: random.Random, seq: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        type="GroupNudgeEvent",
+        group_id=rng.choice(GROUPS),
+        template_id=1133,
+        action_text="戳了戳",
+        suffix_text="",
+        sender_id=rng.choice(MEMBERS),
+        receiver_id=rng.choice(MEMBERS),
+    )
+
+
+def member_joined(rng: random.Random, seq: int) -> SimpleNamespace:
+    return SimpleNamespace(type="GroupMemberJoinedEvent", group_id=rng.choice(GROUPS), uin=rng.choice(MEMBERS))
+
+
+def member_leave(rng: random.Random, seq: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        type="GroupMemberLeaveEvent", group_id=rng.choice(GROUPS), uin=rng.choice(MEMBERS), operator=None
+    )
+
+
+# (factory, weight), roughly the mix seen by a busy bot
+MIX = [
+    (group_message, 80),
+    (private_message, 12),
+    (group_nudge, 4),
+    (member_joined, 2),
+    (member_leave, 2),
+]
+
+
+def synthetic_events(count: int, seed: int = 0) -> Iterator[SimpleNamespace]:
+    """Raw CAI-like events, only carrying the attributes the parsers read."""
+    rng = random.Random(seed)
+    factories = [factory for factory, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    for seq in range(count):
+        yield rng.choices(factories, weights)[0](rng, seq)
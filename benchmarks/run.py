@@ -0,0 +1,166 @@
+"""Micro-benchmarks of event parsing and message (de)serialization.
+
+Runs fully in process against a fake CAI client, no login is needed::
+
+    python -m benchmarks.run --events 20000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from collections import defaultdict
+from hashlib import md5
+from types import SimpleNamespace
+from typing import Any, Awaitable, Dict, List, Tuple
+
+from avilla.cai.client import CAIClient
+from avilla.cai.config import CAIConfig
+from avilla.cai.element import Face
+from avilla.cai.fake import FakeClient
+from avilla.cai.protocol import CAIProtocol
+from avilla.cai.resource import CAIImageResource
+from avilla.cai.selector import group_context
+from avilla.cai.service import CAIService
+from avilla.core.elements import Notice, Picture
+from avilla.spec.core.message import MessageReceived
+from graia.amnesia.message import __message_chain_class__
+from graia.amnesia.message.element import Text
+
+from .events import GROUPS, MEMBERS, synthetic_events
+
+ACCOUNT = 10000
+
+
+class Timings:
+    def __init__(self):
+        self.enabled = True
+        self.samples: Dict[str, List[int]] = defaultdict(list)
+
+    async def measure(self, label: str, coro: Awaitable[Any]) -> Any:
+        if not self.enabled:
+            return await coro
+        started = time.perf_counter_ns()
+        result = await coro
+        self.samples[label].append(time.perf_counter_ns() - started)
+        return result
+
+    def report(self, title: str):
+        print(f"\n{title}")
+        print(f"{'stage':<36}{'count':>8}{'ops/s':>12}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}")
+        for label, samples in sorted(self.samples.items()):
+            samples.sort()
+            total = sum(samples) or 1
+
+            def pct(p: float) -> float:
+                return samples[min(len(samples) - 1, int(len(samples) * p))] / 1000
+
+            print(
+                f"{label:<36}{len(samples):>8}{len(samples) / total * 1e9:>12.0f}"
+                f"{pct(0.5):>10.1f}{pct(0.9):>10.1f}{pct(0.99):>10.1f}{samples[-1] / 1000:>10.1f}"
+            )
+
+
+def build(lazy: bool = False) -> CAIClient:
+    protocol = CAIProtocol()
+    protocol.service = CAIService(protocol)
+    config = CAIConfig(ACCOUNT, "", cache_root=None, lazy_message=lazy)
+    return CAIClient(protocol, config, FakeClient(ACCOUNT, seed=0))  # type: ignore
+
+
+def chains(connection: CAIClient) -> List[Tuple[str, Any]]:
+    resource = CAIImageResource("bench.png", "https://example.invalid/bench.png")
+    digest = md5(resource.id.encode()).digest()
+    # pictures are served from the upload cache, uploads are not part of this benchmark
+    connection.uploads.remember(resource, digest)
+    for group_id in GROUPS:
+        connection.uploads.set(digest, group_id, "image", SimpleNamespace(type="image"))
+    member = connection.selectors.member(str(GROUPS[0]), str(MEMBERS[0]))
+    return [
+        ("text", __message_chain_class__([Text("hello " * 8)])),
+        ("notice+text", __message_chain_class__([Notice(member), Text("hello")])),
+        ("text+face", __message_chain_class__([Text("hello"), Face(12)])),
+        ("text+picture", __message_chain_class__([Text("look"), Picture(resource)])),
+    ]
+
+
+async def bench(events: int, rounds: int, lazy: bool) -> Tuple[Timings, Dict[str, Tuple[float, float]]]:
+    connection = build(lazy)
+    protocol, account = connection.protocol, connection.account
+    timings = Timings()
+    raw_events = list(synthetic_events(events))
+    received = []
+
+    async def parse_all():
+        for raw in raw_events:
+            result = await timings.measure(f"parse_event:{raw.type}", protocol.parse_event(account, raw))
+            if result is not None and isinstance(result[0], MessageReceived):
+                received.append(result[0])
+
+    async def deserialize_all():
+        for raw in raw_events:
+            if raw.type != "group_message":
+                continue
+            group_id = str(raw.group_id)
+            context = group_context(account, group_id, connection.selectors.member(group_id, str(raw.from_uin)))
+            await timings.measure("deserialize_message", protocol.deserialize_message(context, raw.message))
+
+    async def serialize_all():
+        group_id = str(GROUPS[0])
+        context = group_context(account, group_id, connection.selectors.self_in(group_id))
+        reply = next(
+            (
+                event.message.to_selector()
+                for event in received
+                if event.message.scene.pattern.get("group") == group_id
+            ),
+            None,
+        )
+        samples = chains(connection)
+        for _ in range(rounds):
+            for name, chain in samples:
+                await timings.measure(f"serialize_message:{name}", protocol.serialize_message(chain, context))
+                if reply is not None:
+                    await timings.measure(
+                        f"serialize_message:{name}+reply", protocol.serialize_message(chain, context, reply)
+                    )
+
+    stages = [("parse_event", parse_all), ("deserialize_message", deserialize_all), ("serialize_message", serialize_all)]
+    for _, stage in stages:
+        started = time.perf_counter()
+        await stage()
+        if stage is parse_all:
+            elapsed = time.perf_counter() - started
+            print(f"parsed {len(raw_events)} events in {elapsed:.2f}s, {len(raw_events) / elapsed:.0f} events/s")
+
+    # a second pass under tracemalloc, so tracing does not skew the timings
+    allocations: Dict[str, Tuple[float, float]] = {}
+    timings.enabled = False
+    for name, stage in stages:
+        if stage is parse_all:
+            received.clear()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        await stage()
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocations[name] = ((after - before) / 1024, (peak - before) / 1024)
+    return timings, allocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000, help="synthetic events to parse")
+    parser.add_argument("--rounds", type=int, default=2000, help="serialization rounds per chain")
+    parser.add_argument("--lazy", action="store_true", help="parse messages into lazy message chains")
+    args = parser.parse_args()
+    timings, allocations = asyncio.run(bench(args.events, args.rounds, args.lazy))
+    timings.report("latency")
+    print(f"\n{'allocations':<36}{'retained KiB':>14}{'peak KiB':>12}")
+    for name, (retained, peak) in allocations.items():
+        print(f"{name:<36}{retained:>14.1f}{peak:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()